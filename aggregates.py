@@ -0,0 +1,419 @@
+"""
+Aggregations behind the dashboard's metric cards and charts
+
+AggregateEngine encodes every grouping dimension as integer codes once at
+load time. A summary for any set of rows is then one gather of those
+codes plus a handful of np.bincount passes, with the per-equipment,
+per-company and headline figures all derived from a single
+equipment x company table.
+
+AggregateCube rolls the rows up further into one cell per distinct
+combination of those dimensions, holding counts and sums. Selections made
+only with the category filters are summarized from the cells, in time
+proportional to the number of cells rather than rows.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Number of bars shown in the top-N charts and tables
+TOP_ROUTES = 10
+TOP_COMPANIES = 15
+TOP_COMPANY_METRICS = 10
+
+
+def _top_counts(counts, labels, n):
+    """Return the n largest non-zero counts as a labelled Series"""
+    top = np.argsort(-counts, kind='stable')[:n]
+    top = top[counts[top] > 0]
+    return pd.Series(counts[top].astype(np.int64), index=labels.take(top), name='count')
+
+
+def _count_codes(codes, weights, size):
+    """Count (or sum weights over) the non-missing codes"""
+    if weights is None:
+        return np.bincount(codes[codes >= 0] if codes.size and codes.min() < 0 else codes, minlength=size)
+    present = codes >= 0
+    return np.bincount(codes[present], weights=weights[present], minlength=size)
+
+
+def _grow(values, shape):
+    """Zero-pad an accumulated count or sum out to a larger shape"""
+    if np.shape(values) == shape:
+        return values
+    grown = np.zeros(shape, dtype=values.dtype)
+    grown[tuple(slice(0, size) for size in values.shape)] = values
+    return grown
+
+
+def _extend_labels(labels, values):
+    """Encode appended values against existing labels, adding unseen ones at the end"""
+    codes = labels.get_indexer(values)
+    unseen = pd.Index(values[codes < 0].dropna().unique()) if (codes < 0).any() else labels[:0]
+    if len(unseen):
+        labels = labels.append(unseen)
+        codes = labels.get_indexer(values)
+    return labels, codes.astype(np.int32)
+
+
+def _gather(codes, rows):
+    return codes if rows is None else codes[rows]
+
+
+def _accumulate(source, rows):
+    """Count and sum the given rows into equipment x company cells and per-label counts
+
+    source is an AggregateEngine, whose rows are postings, or an
+    AggregateCube, whose rows are cells weighted by their row counts.
+    """
+    n_equipment = len(source.equipment_labels)
+    n_companies = len(source.company_labels)
+
+    equipment = _gather(source.equipment_codes, rows)
+    company = _gather(source.company_codes, rows)
+    weights = None if source.weights is None else _gather(source.weights, rows)
+    rate, rate_valid = source.rate.take(rows)
+    distance, distance_valid = source.distance.take(rows)
+    weight, weight_valid = source.weight.take(rows)
+
+    # One equipment x company cell table feeds all per-group and total stats.
+    # Codes are shifted by one so rows with a missing equipment or company
+    # land in slot 0 and new labels only ever grow the table at the end.
+    cells = (equipment.astype(np.int64) + 1) * (n_companies + 1) + (company + 1)
+    shape = (n_equipment + 1, n_companies + 1)
+    size = shape[0] * shape[1]
+
+    def table(weights=None):
+        return np.bincount(cells, weights=weights, minlength=size).reshape(shape)
+
+    counts = table(weights)
+    if weights is not None:
+        count = np.int64(round(weights.sum()))
+    else:
+        count = np.int64(source.size if rows is None else len(rows))
+    return {
+        'count': count,
+        'counts': counts,
+        'rate_sum': table(rate),
+        'rate_count': counts if rate_valid is None else table(rate_valid),
+        'distance_sum': table(distance),
+        'distance_count': counts if distance_valid is None else table(distance_valid),
+        'weight_sum': table(weight),
+        'weight_count': counts if weight_valid is None else table(weight_valid),
+        'route_counts': _count_codes(_gather(source.route_codes, rows), weights, len(source.route_labels)),
+        'posted_counts': _count_codes(_gather(source.posted_days, rows), weights, len(source.posted_labels)),
+        'pickup_counts': _count_codes(_gather(source.pickup_days, rows), weights, len(source.pickup_labels)),
+    }
+
+
+def _finish(source, totals):
+    """Turn accumulated totals into the metrics and chart inputs"""
+    n_equipment = len(source.equipment_labels)
+    counts = totals['counts']
+    rate_sum, rate_count = totals['rate_sum'], totals['rate_count']
+    distance_sum, distance_count = totals['distance_sum'], totals['distance_count']
+    weight_sum, weight_count = totals['weight_sum'], totals['weight_count']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        equipment_rate = rate_sum[1:].sum(axis=1) / rate_count[1:].sum(axis=1)
+        company_rate = rate_sum[:, 1:].sum(axis=0) / rate_count[:, 1:].sum(axis=0)
+        company_distance = distance_sum[:, 1:].sum(axis=0) / distance_count[:, 1:].sum(axis=0)
+        company_weight = weight_sum[:, 1:].sum(axis=0) / weight_count[:, 1:].sum(axis=0)
+        avg_rate = rate_sum.sum() / rate_count.sum()
+
+    equipment_counts = counts[1:].sum(axis=1)
+    company_counts = counts[:, 1:].sum(axis=0)
+    company_rate_counts = rate_count[:, 1:].sum(axis=0)
+
+    total_distance = distance_sum.sum()
+    if source.distance.is_integer:
+        total_distance = int(round(total_distance))
+
+    equipment_present = equipment_counts > 0
+    avg_rate_by_equipment = pd.Series(
+        equipment_rate[equipment_present],
+        index=source.equipment_labels[equipment_present],
+        name='rate_dollars',
+    ).dropna().sort_values(ascending=True)
+
+    company_present = company_counts > 0
+    company_metrics = pd.DataFrame({
+        'Avg_Rate': company_rate[company_present],
+        'Load_Count': company_rate_counts[company_present].astype(np.int64),
+        'Avg_Distance': company_distance[company_present],
+        'Avg_Weight': company_weight[company_present],
+    }, index=pd.Index(source.company_labels[company_present], name='companyName')).round(2)
+
+    return {
+        'count': int(totals['count']),
+        'avg_rate': float(avg_rate),
+        'total_distance': total_distance,
+        'unique_companies': int(np.count_nonzero(company_present)),
+        'route_counts': _top_counts(totals['route_counts'], source.route_labels, TOP_ROUTES),
+        'equipment_counts': _top_counts(equipment_counts, source.equipment_labels, n_equipment),
+        'avg_rate_by_equipment': avg_rate_by_equipment,
+        'company_counts': _top_counts(company_counts, source.company_labels, TOP_COMPANIES),
+        'company_metrics': company_metrics.sort_values('Load_Count', ascending=False, kind='stable').head(TOP_COMPANY_METRICS),
+        'daily_counts': _day_frame(totals['posted_counts'], source.posted_labels, 'Load_Count'),
+        'pickup_counts': _day_frame(totals['pickup_counts'], source.pickup_labels, 'Pickup_Count'),
+    }
+
+
+def _day_frame(counts, days, column):
+    present = counts > 0
+    frame = pd.DataFrame({'Date': days[present], column: counts[present].astype(np.int64)})
+    # Days first seen in appended rows are labelled after the sorted ones
+    if not frame['Date'].is_monotonic_increasing:
+        frame = frame.sort_values('Date', kind='stable', ignore_index=True)
+    return frame
+
+
+class _Measure:
+    """A numeric column with its missing values zeroed for bincount weights"""
+
+    def __init__(self, column):
+        values = column.to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        self.is_integer = pd.api.types.is_integer_dtype(column)
+        self.values = np.where(missing, 0.0, values) if missing.any() else values
+        # Validity weights are only kept when something is actually missing
+        self.valid = (~missing).astype(np.float64) if missing.any() else None
+
+    @classmethod
+    def from_sums(cls, sums, valid_counts, is_integer):
+        """A measure whose 'rows' are cells holding value sums and valid counts"""
+        measure = cls.__new__(cls)
+        measure.is_integer = is_integer
+        measure.values = sums
+        measure.valid = valid_counts
+        return measure
+
+    def extended(self, column):
+        """Return the measure with the values of appended rows added"""
+        measure = copy.copy(self)
+        values = column.to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        measure.is_integer = self.is_integer and pd.api.types.is_integer_dtype(column)
+        measure.values = np.concatenate([self.values, np.where(missing, 0.0, values)])
+        if self.valid is not None or missing.any():
+            old_valid = self.valid if self.valid is not None else np.ones(len(self.values))
+            measure.valid = np.concatenate([old_valid, (~missing).astype(np.float64)])
+        return measure
+
+    def take(self, rows):
+        if rows is None:
+            return self.values, self.valid
+        return self.values[rows], None if self.valid is None else self.valid[rows]
+
+
+class AggregateEngine:
+    """Precomputed codes and the unfiltered baseline for fast per-selection summaries"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        # Rows stand for themselves; AggregateCube cells weigh in with their row counts
+        self.weights = None
+        self._encode(df)
+
+        posted_days, self.posted_labels = pd.factorize(df['posted_date_only'], sort=True)
+        pickup_days, self.pickup_labels = pd.factorize(df['pickup_date_only'], sort=True)
+        self.posted_days = posted_days.astype(np.int32)
+        self.pickup_days = pickup_days.astype(np.int32)
+
+        self.rate = _Measure(df['rate_dollars'])
+        self.distance = _Measure(df['distanceMiles'])
+        self.weight = _Measure(df['weight'])
+
+        # Rows with a known equipment and weight, ordered by equipment then weight,
+        # so a selection's per-equipment weight distributions are already sorted
+        self.weight_values = df['weight'].to_numpy(dtype=np.float64)
+        self.weight_known = (self.equipment_codes >= 0) & ~np.isnan(self.weight_values)
+        known = np.flatnonzero(self.weight_known)
+        self.weight_order = known[np.lexsort((self.weight_values[known], self.equipment_codes[known]))]
+
+        # The unfiltered totals are needed on every rerun for the metric deltas,
+        # and are kept raw so appended rows can be added to them
+        self.baseline_totals = _accumulate(self, None)
+        self.baseline = _finish(self, self.baseline_totals)
+
+    def _encode(self, df):
+        self.equipment_codes = df['equipmentType'].cat.codes.to_numpy()
+        self.equipment_labels = df['equipmentType'].cat.categories
+        self.company_codes = df['companyName'].cat.codes.to_numpy()
+        self.company_labels = df['companyName'].cat.categories
+        self.route_codes = df['route'].cat.codes.to_numpy()
+        self.route_labels = df['route'].cat.categories
+
+    def extended(self, df):
+        """Return an engine for df, which is this engine's frame with rows appended
+
+        Only the appended rows are encoded and accumulated; the baseline
+        totals are grown and added to rather than recomputed.
+        """
+        engine = copy.copy(self)
+        old_size, engine.size = self.size, len(df)
+        engine._encode(df)
+        added = slice(old_size, engine.size)
+
+        engine.posted_labels, posted_days = _extend_labels(self.posted_labels, df['posted_date_only'].iloc[added])
+        engine.pickup_labels, pickup_days = _extend_labels(self.pickup_labels, df['pickup_date_only'].iloc[added])
+        engine.posted_days = np.concatenate([self.posted_days, posted_days])
+        engine.pickup_days = np.concatenate([self.pickup_days, pickup_days])
+
+        engine.rate = self.rate.extended(df['rate_dollars'].iloc[added])
+        engine.distance = self.distance.extended(df['distanceMiles'].iloc[added])
+        engine.weight = self.weight.extended(df['weight'].iloc[added])
+
+        # Merge the appended known weights into the presorted order, group by group
+        new_weights = df['weight'].iloc[added].to_numpy(dtype=np.float64)
+        new_equipment = engine.equipment_codes[added]
+        new_known = (new_equipment >= 0) & ~np.isnan(new_weights)
+        engine.weight_values = np.concatenate([self.weight_values, new_weights])
+        engine.weight_known = np.concatenate([self.weight_known, new_known])
+        rows = np.flatnonzero(new_known)
+        rows = rows[np.lexsort((new_weights[rows], new_equipment[rows]))]
+        old_order = self.weight_order
+        old_groups = self.equipment_codes[old_order]
+        old_weights = self.weight_values[old_order]
+        insert_at = np.empty(len(rows), dtype=np.int64)
+        for code in np.unique(new_equipment[rows]):
+            group = new_equipment[rows] == code
+            start, stop = np.searchsorted(old_groups, [code, code + 1])
+            insert_at[group] = start + np.searchsorted(old_weights[start:stop], new_weights[rows[group]], side='right')
+        engine.weight_order = np.insert(old_order, insert_at, rows + old_size)
+
+        totals = _accumulate(engine, np.arange(old_size, engine.size))
+        engine.baseline_totals = {
+            name: _grow(self.baseline_totals[name], value.shape) + value
+            for name, value in totals.items()
+        }
+        engine.baseline = _finish(engine, engine.baseline_totals)
+        return engine
+
+    def summarize(self, rows=None):
+        """Compute every metric and chart aggregate for the given row positions
+
+        rows=None summarizes the whole frame.
+        """
+        return _finish(self, _accumulate(self, rows))
+
+    def weight_by_equipment(self, rows=None):
+        """Return the selected weights sorted within equipment type, and each type's bounds
+
+        Group g's weights are sorted_weights[bounds[g]:bounds[g + 1]].
+        """
+        if rows is None:
+            order = self.weight_order
+        elif len(rows) * 16 >= self.size:
+            # Large selections filter the presorted order in one linear pass
+            selected = np.zeros(self.size, dtype=bool)
+            selected[rows] = True
+            order = self.weight_order[selected[self.weight_order]]
+        else:
+            rows = rows[self.weight_known[rows]]
+            order = rows[np.lexsort((self.weight_values[rows], self.equipment_codes[rows]))]
+        bounds = np.searchsorted(self.equipment_codes[order], np.arange(len(self.equipment_labels) + 1))
+        return self.weight_values[order], bounds
+
+
+class AggregateCube:
+    """Row counts and measure sums per distinct combination of the grouping codes
+
+    Cells are keyed by equipment, company, lane, origin state, destination
+    state, posted day and pickup day, and are summarized like an
+    AggregateEngine's rows with each cell weighted by its row count. Weight
+    box plots still need the rows and come from the engine only.
+    """
+
+    DIMENSIONS = ('equipment_codes', 'company_codes', 'route_codes', 'origin_states',
+                  'destination_states', 'posted_days', 'pickup_days')
+
+    def __init__(self, engine, df):
+        self.state_labels = df['originState'].cat.categories
+        dims = self._row_dimensions(engine, df, slice(None))
+        measures = [engine.rate.take(None), engine.distance.take(None), engine.weight.take(None)]
+        self._build(engine, dims, np.ones(engine.size), measures)
+
+    @staticmethod
+    def _row_dimensions(engine, df, rows):
+        return {
+            'equipment_codes': engine.equipment_codes[rows],
+            'company_codes': engine.company_codes[rows],
+            'route_codes': engine.route_codes[rows],
+            'origin_states': df['originState'].cat.codes.to_numpy()[rows],
+            'destination_states': df['destinationState'].cat.codes.to_numpy()[rows],
+            'posted_days': engine.posted_days[rows],
+            'pickup_days': engine.pickup_days[rows],
+        }
+
+    def _build(self, engine, dims, weights, measures):
+        """Group weighted records into cells, summing their weights and measures"""
+        cell = pd.DataFrame(dims).groupby(list(dims), sort=False).ngroup().to_numpy()
+        n_cells = int(cell.max()) + 1 if len(cell) else 0
+        first = np.unique(cell, return_index=True)[1]
+
+        self.rows = engine.size
+        self.size = n_cells
+        self.equipment_labels = engine.equipment_labels
+        self.company_labels = engine.company_labels
+        self.route_labels = engine.route_labels
+        self.posted_labels = engine.posted_labels
+        self.pickup_labels = engine.pickup_labels
+        for name, codes in dims.items():
+            setattr(self, name, codes[first])
+
+        self.weights = np.bincount(cell, weights=weights, minlength=n_cells)
+        self.rate, self.distance, self.weight = [
+            _Measure.from_sums(
+                np.bincount(cell, weights=values, minlength=n_cells),
+                self.weights if valid is None else np.bincount(cell, weights=valid, minlength=n_cells),
+                source.is_integer,
+            )
+            for (values, valid), source in zip(measures, (engine.rate, engine.distance, engine.weight))
+        ]
+        self.baseline = engine.baseline
+
+    def extended(self, engine, df):
+        """Return the cube with the rows the grown engine added beyond this cube's rows
+
+        Existing cells are regrouped together with just the new rows.
+        """
+        cube = copy.copy(self)
+        cube.state_labels = df['originState'].cat.categories
+        added = np.arange(self.rows, engine.size)
+        new_dims = self._row_dimensions(engine, df, added)
+        dims = {name: np.concatenate([getattr(self, name), new_dims[name]]) for name in self.DIMENSIONS}
+        measures = []
+        for cells, rows in ((self.rate, engine.rate), (self.distance, engine.distance), (self.weight, engine.weight)):
+            values, valid = rows.take(added)
+            valid = np.ones(len(added)) if valid is None else valid
+            measures.append((np.concatenate([cells.values, values]), np.concatenate([cells.valid, valid])))
+        cube._build(engine, dims, np.concatenate([self.weights, np.ones(len(added))]), measures)
+        return cube
+
+    def summarize(self, cells=None):
+        """Compute the same summary as AggregateEngine.summarize from cell positions"""
+        return _finish(self, _accumulate(self, cells))
+
+    def select(self, equipment=None, state=None, company=None):
+        """Return the cell positions matching the category filters, or None for all cells"""
+        mask = None
+
+        def code(labels, value):
+            try:
+                return labels.get_loc(value)
+            except KeyError:
+                return -1
+
+        if equipment not in (None, 'All'):
+            mask = self.equipment_codes == code(self.equipment_labels, equipment)
+        if state not in (None, 'All'):
+            state_code = code(self.state_labels, state)
+            matches = (self.origin_states == state_code) | (self.destination_states == state_code)
+            mask = matches if mask is None else mask & matches
+        if company not in (None, 'All'):
+            matches = self.company_codes == code(self.company_labels, company)
+            mask = matches if mask is None else mask & matches
+        return None if mask is None else np.flatnonzero(mask)
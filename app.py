@@ -5,7 +5,21 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from charts import (
+    MAP_CELL_DEGREES, box_figure, box_stats, choose_scatter_mode, density_figure, histogram_counts,
+    histogram_figure, map_grid_threshold, map_points, marker_sizes, scatter_point_budget,
+    sorted_histogram_counts, stratified_sample
+)
+from data_source import enrich_postings, frame_from_postings, read_enriched_postings, resolve_source
+from data_table import PAGE_SIZES, TABLE_COLUMNS, page_count, page_frame, row_count, search_rows, sort_rows
+from dataset import Dataset, DatasetStore, scan_source
+from frame_cache import load_or_build
+from geo import deadhead_miles
+from instrumentation import RunTimer, profiling_enabled
+from matching import DEFAULT_MAX_DEADHEAD, DEFAULT_TOP_K, read_fleet
+from selection_cache import SelectionCache, normalize_selection
 
 # Page configuration
 st.set_page_config(
@@ -232,81 +246,517 @@ SAMPLE_DATA = {
     ]
 }
 
-@st.cache_data
-def load_data():
-    """Load and process the hardcoded load postings data"""
+# Evicting or clearing the cached store stops its watcher thread
+@st.cache_resource(on_release=lambda store: store and store.stop_watcher())
+def load_dataset(source=None):
+    """Load postings from the configured source or the hardcoded data, with their indexes
+
+    The returned store is shared by every session on the server and a
+    background thread swaps new postings into it; its frames must be
+    treated as read-only.
+    """
+    # Stream the configured file/directory, falling back to the hardcoded data
+    source = resolve_source(source)
+    files = None
+    if source:
+        # Stat before reading, so postings appended during the read are not skipped
+        files = scan_source(source)
+        df = load_or_build(source, read_enriched_postings)
+    else:
+        df = enrich_postings(frame_from_postings(SAMPLE_DATA['load_postings']))
+    
+    store = DatasetStore(Dataset(df), source, cache_frames=bool(source), files=files)
+    store.start_watcher()
+    return store
+
+def load_store(source=None):
+    """Return the shared DatasetStore, or None after showing why it could not be loaded
+
+    A failed load raises out of load_dataset so it is not cached, and the
+    next rerun tries again.
+    """
     try:
-        # Use hardcoded data instead of file
-        data = SAMPLE_DATA
-        df = pd.DataFrame(data['load_postings'])
-        
-        # Convert timestamps to datetime
-        df['posted_date'] = pd.to_datetime(df['postedTimestamp'], unit='ms')
-        df['pickup_date'] = pd.to_datetime(df['pickupTimestamp'], unit='ms')
+        return load_dataset(source)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+def load_data(source=None):
+    """Return the current load postings frame (read-only, shared by every session)"""
+    store = load_store(source)
+    return store.current().df if store is not None else pd.DataFrame()
+
+@st.cache_resource
+def load_selection_cache(source=None):
+    """Selection results shared by every session on this server process"""
+    return SelectionCache()
+
+def time_range_slider(label, index):
+    """Sidebar slider over a timestamp index, returning an epoch-ms range or None for all times"""
+    low, high = index.value_range()
+    # Whole hours, so the handles move in one-hour steps
+    start = pd.Timestamp(low, unit='ms').floor('h').to_pydatetime()
+    end = pd.Timestamp(high, unit='ms').ceil('h').to_pydatetime()
+    if end <= start:
+        end = start + timedelta(hours=1)
+    chosen = st.sidebar.slider(label, start, end, (start, end), step=timedelta(hours=1), format="MMM D, HH:mm")
+    chosen_low, chosen_high = (pd.Timestamp(value).value // 1_000_000 for value in chosen)
+    if chosen_low <= low and chosen_high >= high:
+        return None
+    return chosen_low, chosen_high
+
+def location_input(label, places, key, none_label='Anywhere', default=None):
+    """Pick a city from the feed or type a coordinate, returning (lat, lon) or None
+
+    Without a none_label a location is always chosen, starting at default.
+    """
+    options = ([none_label] if none_label else []) + ['Coordinate'] + list(places.index)
+    index = options.index(default) if default in options else 0
+    place = st.selectbox(label, options, index=index, key=f"{key}_place")
+    if place == none_label:
+        return None
+    if place == 'Coordinate':
+        lat = st.number_input("Latitude", -90.0, 90.0, 39.83, key=f"{key}_lat")
+        lon = st.number_input("Longitude", -180.0, 180.0, -98.58, key=f"{key}_lon")
+        return float(lat), float(lon)
+    lat, lon = places.loc[place, ['lat', 'lon']]
+    return float(lat), float(lon)
+
+def radius_filter(label, places):
+    """Sidebar inputs for "within N miles of" a city or coordinate, returning (lat, lon, miles) or None"""
+    key = label.lower()
+    location = location_input(f"{label} near", places, key)
+    if location is None:
+        return None
+    miles = st.number_input(f"{label} within (miles)", 1, 3000, 100, step=25, key=f"{key}_miles")
+    return location + (float(miles),)
+
+def cached_tab_figures(selection_key, name, build):
+    """Build a tab's figures once per filter selection for this session"""
+    cache = st.session_state.get('tab_figures')
+    if cache is None or cache['selection'] != selection_key:
+        # Figures for an older selection can never be shown again
+        cache = st.session_state['tab_figures'] = {'selection': selection_key, 'figures': {}}
+    if name not in cache['figures']:
+        cache['figures'][name] = build()
+    return cache['figures'][name]
+
+def cached_table_rows(key, build):
+    """Keep the data table's searched and sorted row order for this session
+
+    Only the latest order is kept, so paging reuses it without holding one
+    position array per search term.
+    """
+    cached = st.session_state.get('table_rows')
+    if cached is None or cached[0] != key:
+        cached = st.session_state['table_rows'] = (key, build())
+    return cached[1]
+
+def bar_frame(series):
+    """Columns x (values) and y (labels) for a horizontal bar chart
+
+    Plotly Express rejects empty x= and y= arrays, which a narrow time
+    filter can produce, but accepts empty columns.
+    """
+    return pd.DataFrame({'x': series.to_numpy(), 'y': series.index})
+
+def build_geographic_figures(filtered_df, summary, map_mode):
+    """Build the load map and top routes chart"""
+    note = None
+    
+    # Create scatter mapbox for origins and destinations
+    fig_map = go.Figure()
+    
+    if map_mode == "Aggregated":
+        # One marker per location (or grid cell), sized by load count
+        threshold = map_grid_threshold()
+        binning = {}
+        for prefix, color, name in (('origin', 'red', 'Origins'), ('destination', 'blue', 'Destinations')):
+            points, binning[name] = map_points(filtered_df, prefix, threshold)
+            fig_map.add_trace(go.Scattermapbox(
+                lat=points['lat'],
+                lon=points['lon'],
+                mode='markers',
+                marker=dict(
+                    size=marker_sizes(points['count']),
+                    color=color,
+                    opacity=0.7
+                ),
+                text=points['label'],
+                customdata=points['count'],
+                name=name,
+                hovertemplate='<b>%{text}</b><br>Loads: %{customdata:,}<br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+            ))
         
-        # Convert rate from cents to dollars
-        df['rate_dollars'] = df['rateCents'] / 100
-        df['rate_per_mile_dollars'] = df['rateCentsPerMile'] / 100
+        if 'grid' in binning.values():
+            note = f"More than {threshold:,} distinct locations: points are binned into {MAP_CELL_DEGREES}° grid cells."
+    else:
+        # Add origin points
+        fig_map.add_trace(go.Scattermapbox(
+            lat=filtered_df['originLatitude'],
+            lon=filtered_df['originLongitude'],
+            mode='markers',
+            marker=dict(
+                size=8,
+                color='red',
+                opacity=0.7
+            ),
+            text=filtered_df['originCity'].astype(str) + ', ' + filtered_df['originState'].astype(str),
+            name='Origins',
+            hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+        ))
         
-        # Create origin-destination pairs
-        df['route'] = df['originCity'] + ', ' + df['originState'] + ' → ' + df['destinationCity'] + ', ' + df['destinationState']
+        # Add destination points
+        fig_map.add_trace(go.Scattermapbox(
+            lat=filtered_df['destinationLatitude'],
+            lon=filtered_df['destinationLongitude'],
+            mode='markers',
+            marker=dict(
+                size=8,
+                color='blue',
+                opacity=0.7
+            ),
+            text=filtered_df['destinationCity'].astype(str) + ', ' + filtered_df['destinationState'].astype(str),
+            name='Destinations',
+            hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+        ))
+    
+    fig_map.update_layout(
+        mapbox=dict(
+            style="open-street-map",
+            center=dict(lat=39.8283, lon=-98.5795),  # Center of USA
+            zoom=3
+        ),
+        height=600,
+        title="Load Origins (Red) and Destinations (Blue)"
+    )
+    
+    # Top routes
+    route_counts = summary['route_counts']
+    fig_routes = px.bar(
+        bar_frame(route_counts),
+        x='x',
+        y='y',
+        orientation='h',
+        title="Most Popular Routes",
+        labels={'x': 'Number of Loads', 'y': 'Route'}
+    )
+    fig_routes.update_layout(height=400)
+    
+    return {'map': fig_map, 'routes': fig_routes, 'note': note}
+
+def build_rate_figures(filtered_df, filter_index, selection):
+    """Build the rate histograms and the rate vs distance scatter"""
+    # Rate histogram, binned server-side. With only the rate slider active the
+    # bins come straight from binary searches on the sorted rate index.
+    others = ('equipment', 'state', 'company', 'posted_range', 'pickup_range', 'origin_radius', 'destination_radius')
+    if all(selection.get(name) in (None, 'All') for name in others):
+        start, stop = filter_index.rate.bounds(*selection['rate_range'])
+        rate_counts, rate_edges = sorted_histogram_counts(filter_index.rate.sorted_values, start, stop)
+    else:
+        rate_counts, rate_edges = histogram_counts(filtered_df['rate_dollars'].to_numpy(dtype=np.float64))
+    fig_hist = histogram_figure(rate_counts, rate_edges, "Rate Distribution", "Rate ($)")
+    
+    # Rate per mile histogram
+    mile_counts, mile_edges = histogram_counts(filtered_df['rate_per_mile_dollars'].to_numpy(dtype=np.float64))
+    fig_hist_mile = histogram_figure(mile_counts, mile_edges, "Rate per Mile Distribution", "Rate per Mile ($)")
+    
+    return {
+        'rate_histogram': fig_hist,
+        'rate_per_mile_histogram': fig_hist_mile,
+    }
+
+def build_deadhead_figures(filtered_df, trucks, end):
+    """Build rate per total mile (loaded + deadhead) for loads taken by the nearest truck"""
+    origin_deadhead, destination_deadhead, _ = deadhead_miles(filtered_df, trucks['lat'], trucks['lon'], end)
+    loaded = filtered_df['distanceMiles'].to_numpy(dtype=np.float64, na_value=np.nan)
+    total = loaded + origin_deadhead + destination_deadhead
+    rate = filtered_df['rate_dollars'].to_numpy(dtype=np.float64)
+    per_total_mile = np.divide(rate, total, out=np.full(len(rate), np.nan), where=total > 0)
+    
+    counts, edges = histogram_counts(per_total_mile)
+    fig = histogram_figure(counts, edges, "Rate per Total Mile (Loaded + Deadhead)", "Rate per Total Mile ($)")
+    
+    # Mile-weighted averages: total revenue over total miles
+    known = ~np.isnan(per_total_mile)
+    deadhead = origin_deadhead[known] + destination_deadhead[known]
+    return {
+        'histogram': fig,
+        'avg_deadhead': float(deadhead.mean()) if known.any() else None,
+        'rate_per_loaded_mile': rate[known].sum() / loaded[known].sum() if known.any() else None,
+        'rate_per_total_mile': rate[known].sum() / total[known].sum() if known.any() else None,
+    }
+
+def build_match_figure(matches, title):
+    """Bar chart of matched loads by revenue per total mile, best on top"""
+    fig = px.bar(
+        matches.iloc[::-1],
+        x='rate_per_total_mile',
+        y='referenceNumber',
+        orientation='h',
+        hover_data=['route', 'deadhead_miles', 'total_miles', 'rate_dollars'],
+        title=title,
+        labels={'rate_per_total_mile': 'Rate per Total Mile ($)', 'referenceNumber': 'Load'}
+    )
+    fig.update_layout(height=max(300, 30 * len(matches) + 120))
+    return fig
+
+def build_scatter_figure(filtered_df, requested_mode):
+    """Build the rate vs distance chart, sampling or binning it past the point budget"""
+    budget = scatter_point_budget()
+    mode = choose_scatter_mode(len(filtered_df), budget, requested_mode)
+    title = "Rate vs Distance by Equipment Type"
+    labels = {'distanceMiles': 'Distance (miles)', 'rate_dollars': 'Rate ($)'}
+    
+    if mode == 'density':
+        fig_scatter = density_figure(
+            filtered_df['equipmentType'].cat.codes.to_numpy(),
+            filtered_df['equipmentType'].cat.categories,
+            filtered_df['distanceMiles'],
+            filtered_df['rate_dollars'],
+            title, labels['distanceMiles'], labels['rate_dollars']
+        )
+        note = f"Density view of {len(filtered_df):,} loads (point budget {budget:,})."
+    else:
+        points = filtered_df
+        note = f"All {len(filtered_df):,} loads plotted as points (point budget {budget:,})."
+        if mode == 'sample':
+            sample = stratified_sample(
+                filtered_df['equipmentType'].cat.codes.to_numpy(),
+                filtered_df['distanceMiles'],
+                filtered_df['rate_dollars'],
+                budget
+            )
+            points = filtered_df.iloc[sample]
+            note = (f"Showing a stratified sample of {len(points):,} of {len(filtered_df):,} loads "
+                    f"(point budget {budget:,}), keeping equipment proportions and outliers.")
         
-        return df
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return pd.DataFrame()
+        # Rate vs Distance scatter
+        fig_scatter = px.scatter(
+            points,
+            x='distanceMiles',
+            y='rate_dollars',
+            color='equipmentType',
+            size='weight',
+            hover_data=['originCity', 'destinationCity', 'companyName'],
+            title=title,
+            labels=labels
+        )
+    
+    return {'scatter': fig_scatter, 'note': note}
+
+def build_equipment_figures(aggregate_engine, rows, summary):
+    """Build the equipment share, average rate and weight distribution charts"""
+    # Equipment type pie chart
+    equipment_counts = summary['equipment_counts']
+    fig_pie = px.pie(
+        bar_frame(equipment_counts),
+        values='x',
+        names='y',
+        title="Load Distribution by Equipment Type"
+    )
+    
+    # Average rate by equipment type
+    avg_rates = summary['avg_rate_by_equipment']
+    fig_bar = px.bar(
+        bar_frame(avg_rates),
+        x='x',
+        y='y',
+        orientation='h',
+        title="Average Rate by Equipment Type",
+        labels={'x': 'Average Rate ($)', 'y': 'Equipment Type'}
+    )
+    
+    # Weight distribution by equipment type, with quartiles computed here
+    sorted_weights, bounds = aggregate_engine.weight_by_equipment(rows)
+    fig_box = box_figure(
+        box_stats(sorted_weights, bounds, aggregate_engine.equipment_labels),
+        "Weight Distribution by Equipment Type",
+        'Equipment Type',
+        'Weight (lbs)'
+    )
+    
+    return {'pie': fig_pie, 'avg_rate': fig_bar, 'weight_box': fig_box}
+
+def build_company_figures(summary):
+    """Build the top companies chart"""
+    # Top companies by load count
+    company_counts = summary['company_counts']
+    fig_companies = px.bar(
+        bar_frame(company_counts),
+        x='x',
+        y='y',
+        orientation='h',
+        title="Top Companies by Load Count",
+        labels={'x': 'Number of Loads', 'y': 'Company'}
+    )
+    fig_companies.update_layout(height=500)
+    return {'companies': fig_companies}
+
+def build_time_figures(summary):
+    """Build the posting and pickup timelines"""
+    # Loads by posted date
+    fig_timeline = px.line(
+        summary['daily_counts'],
+        x='Date',
+        y='Load_Count',
+        title="Load Postings Over Time",
+        labels={'Load_Count': 'Number of Loads', 'Date': 'Date'}
+    )
+    
+    # Pickup date analysis
+    fig_pickup = px.line(
+        summary['pickup_counts'],
+        x='Date',
+        y='Pickup_Count',
+        title="Scheduled Pickups Over Time",
+        labels={'Pickup_Count': 'Number of Pickups', 'Date': 'Date'}
+    )
+    return {'posted': fig_timeline, 'pickup': fig_pickup}
 
 def main():
+    # Section timings, only collected when profiling is switched on
+    timer = RunTimer(profiling_enabled(st.query_params))
+    
     # Header
     st.markdown('<h1 class="main-header">🚛 Logistics Dashboard</h1>', unsafe_allow_html=True)
-    st.markdown("---")
     
     # Load data
-    df = load_data()
+    with timer.section("load"):
+        store = load_store()
     
-    if df.empty:
+    if store is None or store.current().df.empty:
+        st.markdown("---")
         st.error("No data available. Please check the data configuration.")
         return
     
+    # Pick up postings added to the source since it was loaded
+    if store.source and st.sidebar.button("Check for new postings"):
+        if store.watching:
+            # The watcher parses off the request path; this run keeps the current data
+            store.wake()
+            st.sidebar.caption("Checking for new postings in the background")
+        else:
+            added = store.refresh()
+            st.sidebar.caption(f"Added {added:,} new postings" if added else "No new postings")
+    
+    # One consistent snapshot for the whole run, even if the watcher swaps in new data
+    with timer.section("load/snapshot"):
+        dataset = store.current()
+    df = dataset.df
+    
+    if store.source:
+        st.caption(
+            f"Data refreshed {store.updated_at:%Y-%m-%d %H:%M:%S} · "
+            f"last checked {store.checked_at:%H:%M:%S} · {len(dataset):,} loads"
+        )
+        if store.last_error is not None:
+            st.warning(f"Last refresh failed, showing the previous data: {store.last_error}")
+    st.markdown("---")
+    
     # Sidebar filters
     st.sidebar.header("🔍 Filters")
     
     # Equipment type filter
-    equipment_types = ['All'] + sorted(df['equipmentType'].unique().tolist())
-    selected_equipment = st.sidebar.selectbox("Equipment Type", equipment_types)
+    with timer.section("filter/widget/equipment"):
+        equipment_types = ['All'] + sorted(df['equipmentType'].cat.categories)
+        selected_equipment = st.sidebar.selectbox("Equipment Type", equipment_types)
     
     # State filter
-    all_states = sorted(set(df['originState'].tolist() + df['destinationState'].tolist()))
-    selected_state = st.sidebar.selectbox("State", ['All'] + all_states)
+    with timer.section("filter/widget/state"):
+        all_states = sorted(df['originState'].cat.categories)
+        selected_state = st.sidebar.selectbox("State", ['All'] + all_states)
     
     # Company filter
-    companies = ['All'] + sorted(df['companyName'].unique().tolist())
-    selected_company = st.sidebar.selectbox("Company", companies)
+    with timer.section("filter/widget/company"):
+        companies = ['All'] + sorted(df['companyName'].cat.categories)
+        selected_company = st.sidebar.selectbox("Company", companies)
     
     # Rate range filter
-    min_rate = float(df['rate_dollars'].min())
-    max_rate = float(df['rate_dollars'].max())
-    rate_range = st.sidebar.slider("Rate Range ($)", min_rate, max_rate, (min_rate, max_rate))
+    with timer.section("filter/widget/rate"):
+        filter_index = dataset.filter_index
+        min_rate, max_rate = filter_index.rate.value_range()
+        rate_range = st.sidebar.slider("Rate Range ($)", min_rate, max_rate, (min_rate, max_rate))
     
-    # Apply filters
-    filtered_df = df.copy()
+    # Posted and pickup time filters (UTC), binary-searched on sorted timestamps
+    with timer.section("filter/widget/time"):
+        posted_range = time_range_slider("Posted Time (UTC)", filter_index.posted)
+        pickup_range = time_range_slider("Pickup Time (UTC)", filter_index.pickup)
     
-    if selected_equipment != 'All':
-        filtered_df = filtered_df[filtered_df['equipmentType'] == selected_equipment]
+    # Radius searches, checked against nearby cells of the coordinate grids
+    with timer.section("filter/widget/radius"):
+        with st.sidebar.expander("📍 Radius Search"):
+            places = dataset.places()
+            origin_radius = radius_filter("Origin", places)
+            destination_radius = radius_filter("Destination", places)
     
-    if selected_state != 'All':
-        filtered_df = filtered_df[
-            (filtered_df['originState'] == selected_state) | 
-            (filtered_df['destinationState'] == selected_state)
-        ]
+    # Frame memory after the dtype schema
+    memory_usage = df.attrs.get('memory_usage')
+    if memory_usage:
+        st.sidebar.caption(
+            f"Data memory: {memory_usage['after'] / 1e6:,.2f} MB "
+            f"(was {memory_usage['before'] / 1e6:,.2f} MB)"
+        )
     
-    if selected_company != 'All':
-        filtered_df = filtered_df[filtered_df['companyName'] == selected_company]
+    # Apply filters through the precomputed indexes, reusing results other sessions computed
+    selection_cache = load_selection_cache()
+    selection = dict(
+        equipment=selected_equipment,
+        state=selected_state,
+        company=selected_company,
+        rate_range=rate_range,
+        posted_range=posted_range,
+        pickup_range=pickup_range,
+        origin_radius=origin_radius,
+        destination_radius=destination_radius,
+    )
     
-    filtered_df = filtered_df[
-        (filtered_df['rate_dollars'] >= rate_range[0]) & 
-        (filtered_df['rate_dollars'] <= rate_range[1])
-    ]
+    # Timed sections inside these only run on a cache miss; hits show up
+    # in filter/lookup alone
+    def compute_rows():
+        with timer.section("filter/select"):
+            return {'rows': filter_index.select(**selection)}
+    
+    def compute_summary():
+        if not any(normalized):
+            # Nothing filtered: the engine's baseline already summarizes every row,
+            # so a fresh start does not build the cube until a filter is set
+            return {'summary': aggregate_engine.baseline}
+        if normalized.category_only:
+            # Only category filters: they slice the precomputed cube
+            with timer.section("filter/cube"):
+                return {'summary': dataset.cube.summarize(dataset.cube.select(
+                    selected_equipment, selected_state, selected_company
+                ))}
+        with timer.section("filter/summarize"):
+            return {'summary': aggregate_engine.summarize(selection_rows())}
+    
+    def selection_rows():
+        return selection_cache.get_or_compute(('rows',) + selection_key, compute_rows)['rows']
+    
+    aggregate_engine = dataset.aggregate_engine
+    # Results for older versions of the dataset are never looked up again
+    normalized = normalize_selection(full_rate_range=(min_rate, max_rate), **selection)
+    selection_key = (dataset.version,) + normalized
+    with timer.section("filter/lookup"):
+        summary = selection_cache.get_or_compute(('summary',) + selection_key, compute_summary)['summary']
+    baseline = aggregate_engine.baseline
+    
+    # Row positions and the filtered frame are only built for the parts that show rows
+    filtered = {}
+    
+    def filtered_frame():
+        if 'df' not in filtered:
+            rows = selection_rows()
+            with timer.section("filter/take"):
+                filtered['df'] = df if rows is None else df.take(rows)
+        return filtered['df']
+    
+    stats = selection_cache.stats()
+    st.sidebar.caption(
+        f"Selection cache: {stats['hits']:,} hits / {stats['misses']:,} misses, "
+        f"{stats['entries']} entries ({stats['bytes'] / 1e6:,.1f} MB)"
+    )
     
     # Key metrics
     st.header("📊 Key Metrics")
@@ -314,274 +764,256 @@ def main():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric(
-            label="Total Loads",
-            value=f"{len(filtered_df):,}",
-            delta=f"{len(filtered_df) - len(df):+,}" if len(filtered_df) != len(df) else None
-        )
+        with timer.section("metric/total_loads"):
+            st.metric(
+                label="Total Loads",
+                value=f"{summary['count']:,}",
+                delta=f"{summary['count'] - baseline['count']:+,}" if summary['count'] != baseline['count'] else None
+            )
     
     with col2:
-        avg_rate = filtered_df['rate_dollars'].mean()
-        st.metric(
-            label="Average Rate",
-            value=f"${avg_rate:,.0f}",
-            delta=f"${avg_rate - df['rate_dollars'].mean():+,.0f}" if len(filtered_df) != len(df) else None
-        )
+        with timer.section("metric/average_rate"):
+            avg_rate = summary['avg_rate']
+            st.metric(
+                label="Average Rate",
+                value=f"${avg_rate:,.0f}",
+                delta=f"${avg_rate - baseline['avg_rate']:+,.0f}" if summary['count'] != baseline['count'] else None
+            )
     
     with col3:
-        total_distance = filtered_df['distanceMiles'].sum()
-        st.metric(
-            label="Total Distance",
-            value=f"{total_distance:,} miles",
-            delta=f"{total_distance - df['distanceMiles'].sum():+,} miles" if len(filtered_df) != len(df) else None
-        )
+        with timer.section("metric/total_distance"):
+            total_distance = summary['total_distance']
+            st.metric(
+                label="Total Distance",
+                value=f"{total_distance:,} miles",
+                delta=f"{total_distance - baseline['total_distance']:+,} miles" if summary['count'] != baseline['count'] else None
+            )
     
     with col4:
-        unique_companies = filtered_df['companyName'].nunique()
-        st.metric(
-            label="Companies",
-            value=f"{unique_companies}",
-            delta=f"{unique_companies - df['companyName'].nunique():+}" if len(filtered_df) != len(df) else None
-        )
+        with timer.section("metric/companies"):
+            unique_companies = summary['unique_companies']
+            st.metric(
+                label="Companies",
+                value=f"{unique_companies}",
+                delta=f"{unique_companies - baseline['unique_companies']:+}" if summary['count'] != baseline['count'] else None
+            )
     
     st.markdown("---")
     
     # Charts section
     st.header("📈 Analytics")
     
-    # Create tabs for different visualizations
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    # Create tabs for different visualizations. Only the open tab runs its
+    # aggregations and figures; the others are built when first opened.
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "🗺️ Geographic Analysis", 
         "💰 Rate Analysis", 
         "🚛 Equipment Analysis", 
         "🏢 Company Analysis",
-        "📅 Time Analysis"
-    ])
+        "📅 Time Analysis",
+        "🚚 Load Matching"
+    ], key="analytics_tab", on_change="rerun")
     
     with tab1:
-        st.subheader("Load Distribution Map")
-        
-        # Create scatter mapbox for origins and destinations
-        fig_map = go.Figure()
-        
-        # Add origin points
-        fig_map.add_trace(go.Scattermapbox(
-            lat=filtered_df['originLatitude'],
-            lon=filtered_df['originLongitude'],
-            mode='markers',
-            marker=dict(
-                size=8,
-                color='red',
-                opacity=0.7
-            ),
-            text=filtered_df['originCity'] + ', ' + filtered_df['originState'],
-            name='Origins',
-            hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
-        ))
-        
-        # Add destination points
-        fig_map.add_trace(go.Scattermapbox(
-            lat=filtered_df['destinationLatitude'],
-            lon=filtered_df['destinationLongitude'],
-            mode='markers',
-            marker=dict(
-                size=8,
-                color='blue',
-                opacity=0.7
-            ),
-            text=filtered_df['destinationCity'] + ', ' + filtered_df['destinationState'],
-            name='Destinations',
-            hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
-        ))
-        
-        fig_map.update_layout(
-            mapbox=dict(
-                style="open-street-map",
-                center=dict(lat=39.8283, lon=-98.5795),  # Center of USA
-                zoom=3
-            ),
-            height=600,
-            title="Load Origins (Red) and Destinations (Blue)"
-        )
-        
-        st.plotly_chart(fig_map, use_container_width=True)
-        
-        # Top routes
-        st.subheader("Top Routes")
-        route_counts = filtered_df['route'].value_counts().head(10)
-        
-        fig_routes = px.bar(
-            x=route_counts.values,
-            y=route_counts.index,
-            orientation='h',
-            title="Most Popular Routes",
-            labels={'x': 'Number of Loads', 'y': 'Route'}
-        )
-        fig_routes.update_layout(height=400)
-        st.plotly_chart(fig_routes, use_container_width=True)
+        if tab1.open:
+            st.subheader("Load Distribution Map")
+            
+            map_mode = st.radio("Map points", ["Aggregated", "Individual loads"], horizontal=True)
+            with timer.section("tab/geographic/figures"):
+                figures = cached_tab_figures(
+                    selection_key, f"geographic:{map_mode}",
+                    lambda: build_geographic_figures(filtered_frame(), summary, map_mode)
+                )
+            
+            if figures['note']:
+                st.caption(figures['note'])
+            timer.plotly_chart('map', figures['map'], use_container_width=True)
+            
+            # Top routes
+            st.subheader("Top Routes")
+            timer.plotly_chart('routes', figures['routes'], use_container_width=True)
     
     with tab2:
-        st.subheader("Rate Distribution")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Rate histogram
-            fig_hist = px.histogram(
-                filtered_df,
-                x='rate_dollars',
-                nbins=50,
-                title="Rate Distribution",
-                labels={'rate_dollars': 'Rate ($)', 'count': 'Number of Loads'}
-            )
-            st.plotly_chart(fig_hist, use_container_width=True)
-        
-        with col2:
-            # Rate per mile histogram
-            fig_hist_mile = px.histogram(
-                filtered_df,
-                x='rate_per_mile_dollars',
-                nbins=50,
-                title="Rate per Mile Distribution",
-                labels={'rate_per_mile_dollars': 'Rate per Mile ($)', 'count': 'Number of Loads'}
-            )
-            st.plotly_chart(fig_hist_mile, use_container_width=True)
-        
-        # Rate vs Distance scatter
-        st.subheader("Rate vs Distance Analysis")
-        fig_scatter = px.scatter(
-            filtered_df,
-            x='distanceMiles',
-            y='rate_dollars',
-            color='equipmentType',
-            size='weight',
-            hover_data=['originCity', 'destinationCity', 'companyName'],
-            title="Rate vs Distance by Equipment Type",
-            labels={'distanceMiles': 'Distance (miles)', 'rate_dollars': 'Rate ($)'}
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
+        if tab2.open:
+            st.subheader("Rate Distribution")
+            with timer.section("tab/rate/figures"):
+                figures = cached_tab_figures(selection_key, "rate", lambda: build_rate_figures(filtered_frame(), filter_index, selection))
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                timer.plotly_chart('rate_histogram', figures['rate_histogram'], use_container_width=True)
+            
+            with col2:
+                timer.plotly_chart('rate_per_mile_histogram', figures['rate_per_mile_histogram'], use_container_width=True)
+            
+            # Revenue once the empty miles to and from the loads are counted
+            st.subheader("Rate per Total Mile")
+            places = dataset.places()
+            truck_col, end_col = st.columns(2)
+            with truck_col:
+                truck_places = st.multiselect("Truck locations", list(places.index), key="truck_places",
+                                              help="Each load is deadheaded from the nearest truck")
+            with end_col:
+                end = location_input("Ending at", places, "deadhead_end", none_label='Anywhere (no return deadhead)')
+            if truck_places:
+                with timer.section("tab/deadhead/figures"):
+                    figures = cached_tab_figures(
+                        selection_key, f"deadhead:{tuple(truck_places)}:{end}",
+                        lambda: build_deadhead_figures(filtered_frame(), places.loc[truck_places], end)
+                    )
+                if figures['avg_deadhead'] is None:
+                    st.info("No loads with coordinates match the filters.")
+                else:
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Average Deadhead", f"{figures['avg_deadhead']:,.0f} miles")
+                    col2.metric("Rate per Loaded Mile", f"${figures['rate_per_loaded_mile']:,.2f}")
+                    col3.metric("Rate per Total Mile", f"${figures['rate_per_total_mile']:,.2f}")
+                    timer.plotly_chart('rate_per_total_mile_histogram', figures['histogram'], use_container_width=True)
+            else:
+                st.caption("Pick truck locations to see deadhead and rate per total mile.")
+            
+            # Rate vs Distance scatter
+            st.subheader("Rate vs Distance Analysis")
+            scatter_mode = st.radio("Scatter mode", ["Auto", "Sample", "Density"], horizontal=True)
+            with timer.section("tab/scatter/figures"):
+                figures = cached_tab_figures(
+                    selection_key, f"scatter:{scatter_mode}",
+                    lambda: build_scatter_figure(filtered_frame(), scatter_mode)
+                )
+            st.caption(figures['note'])
+            timer.plotly_chart('scatter', figures['scatter'], use_container_width=True)
     
     with tab3:
-        st.subheader("Equipment Type Analysis")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Equipment type pie chart
-            equipment_counts = filtered_df['equipmentType'].value_counts()
-            fig_pie = px.pie(
-                values=equipment_counts.values,
-                names=equipment_counts.index,
-                title="Load Distribution by Equipment Type"
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
-        
-        with col2:
-            # Average rate by equipment type
-            avg_rates = filtered_df.groupby('equipmentType')['rate_dollars'].mean().sort_values(ascending=True)
-            fig_bar = px.bar(
-                x=avg_rates.values,
-                y=avg_rates.index,
-                orientation='h',
-                title="Average Rate by Equipment Type",
-                labels={'x': 'Average Rate ($)', 'y': 'Equipment Type'}
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
-        
-        # Weight distribution by equipment type
-        st.subheader("Weight Distribution by Equipment Type")
-        fig_box = px.box(
-            filtered_df,
-            x='equipmentType',
-            y='weight',
-            title="Weight Distribution by Equipment Type",
-            labels={'weight': 'Weight (lbs)', 'equipmentType': 'Equipment Type'}
-        )
-        st.plotly_chart(fig_box, use_container_width=True)
+        if tab3.open:
+            st.subheader("Equipment Type Analysis")
+            with timer.section("tab/equipment/figures"):
+                figures = cached_tab_figures(selection_key, "equipment", lambda: build_equipment_figures(aggregate_engine, selection_rows(), summary))
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                timer.plotly_chart('pie', figures['pie'], use_container_width=True)
+            
+            with col2:
+                timer.plotly_chart('avg_rate', figures['avg_rate'], use_container_width=True)
+            
+            # Weight distribution by equipment type
+            st.subheader("Weight Distribution by Equipment Type")
+            timer.plotly_chart('weight_box', figures['weight_box'], use_container_width=True)
     
     with tab4:
-        st.subheader("Company Analysis")
-        
-        # Top companies by load count
-        company_counts = filtered_df['companyName'].value_counts().head(15)
-        fig_companies = px.bar(
-            x=company_counts.values,
-            y=company_counts.index,
-            orientation='h',
-            title="Top Companies by Load Count",
-            labels={'x': 'Number of Loads', 'y': 'Company'}
-        )
-        fig_companies.update_layout(height=500)
-        st.plotly_chart(fig_companies, use_container_width=True)
-        
-        # Company performance metrics
-        st.subheader("Company Performance Metrics")
-        company_metrics = filtered_df.groupby('companyName').agg({
-            'rate_dollars': ['mean', 'count'],
-            'distanceMiles': 'mean',
-            'weight': 'mean'
-        }).round(2)
-        
-        company_metrics.columns = ['Avg_Rate', 'Load_Count', 'Avg_Distance', 'Avg_Weight']
-        company_metrics = company_metrics.sort_values('Load_Count', ascending=False).head(10)
-        
-        st.dataframe(company_metrics, use_container_width=True)
+        if tab4.open:
+            st.subheader("Company Analysis")
+            with timer.section("tab/company/figures"):
+                figures = cached_tab_figures(selection_key, "company", lambda: build_company_figures(summary))
+            timer.plotly_chart('companies', figures['companies'], use_container_width=True)
+            
+            # Company performance metrics
+            st.subheader("Company Performance Metrics")
+            timer.dataframe('company_metrics', summary['company_metrics'], use_container_width=True)
     
     with tab5:
-        st.subheader("Time-based Analysis")
-        
-        # Loads by posted date
-        filtered_df['posted_date_only'] = filtered_df['posted_date'].dt.date
-        daily_counts = filtered_df.groupby('posted_date_only').size().reset_index()
-        daily_counts.columns = ['Date', 'Load_Count']
-        
-        fig_timeline = px.line(
-            daily_counts,
-            x='Date',
-            y='Load_Count',
-            title="Load Postings Over Time",
-            labels={'Load_Count': 'Number of Loads', 'Date': 'Date'}
-        )
-        st.plotly_chart(fig_timeline, use_container_width=True)
-        
-        # Pickup date analysis
-        filtered_df['pickup_date_only'] = filtered_df['pickup_date'].dt.date
-        pickup_counts = filtered_df.groupby('pickup_date_only').size().reset_index()
-        pickup_counts.columns = ['Date', 'Pickup_Count']
-        
-        fig_pickup = px.line(
-            pickup_counts,
-            x='Date',
-            y='Pickup_Count',
-            title="Scheduled Pickups Over Time",
-            labels={'Pickup_Count': 'Number of Pickups', 'Date': 'Date'}
-        )
-        st.plotly_chart(fig_pickup, use_container_width=True)
+        if tab5.open:
+            st.subheader("Time-based Analysis")
+            with timer.section("tab/time/figures"):
+                figures = cached_tab_figures(selection_key, "time", lambda: build_time_figures(summary))
+            timer.plotly_chart('posted', figures['posted'], use_container_width=True)
+            timer.plotly_chart('pickup', figures['pickup'], use_container_width=True)
+    
+    with tab6:
+        if tab6.open:
+            st.subheader("Best Loads for a Truck")
+            st.caption("Ranked by revenue per total mile (loaded + deadhead). Matching searches every load, "
+                       "not just the sidebar selection.")
+            matcher = dataset.matcher()
+            mode = st.radio("Match", ["One truck", "Fleet (CSV)"], horizontal=True, key="match_mode")
+            top_k = st.number_input("Loads per truck", 1, 100, DEFAULT_TOP_K, key="match_top_k")
+            
+            if mode == "One truck":
+                places = dataset.places()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    location = location_input("Truck at", places, "match_truck", none_label=None,
+                                              default=places.index[0] if len(places) else None)
+                with col2:
+                    equipment = st.selectbox("Truck equipment", ['Any'] + sorted(df['equipmentType'].cat.categories),
+                                             key="match_equipment")
+                    max_deadhead = st.number_input("Max deadhead (miles)", 1, 3000, DEFAULT_MAX_DEADHEAD, step=25,
+                                                   key="match_max_deadhead")
+                with col3:
+                    # Defaults to the earliest pickup, so every load is still ahead of the truck
+                    first_pickup = pd.Timestamp(filter_index.pickup.value_range()[0], unit='ms').floor('h')
+                    available_day = st.date_input("Available from (UTC)", first_pickup.date(), key="match_day")
+                    available_time = st.time_input("Time (UTC)", first_pickup.time(), key="match_time")
+                
+                available_at = pd.Timestamp(datetime.combine(available_day, available_time)).value // 1_000_000
+                with timer.section("tab/matching/truck"):
+                    matches = matcher.match(*location, None if equipment == 'Any' else equipment,
+                                            available_at, max_deadhead, top_k)
+                if matches.empty:
+                    st.info("No loads within reach of this truck; try a longer deadhead or earlier time.")
+                timer.plotly_chart('matches', build_match_figure(matches, "Top Loads for This Truck"),
+                                   use_container_width=True)
+                timer.dataframe('matches_table', matches, use_container_width=True, hide_index=True)
+            else:
+                fleet_file = st.file_uploader(
+                    "Fleet CSV: lat, lon and optionally truck_id, equipment, available_at, max_deadhead",
+                    type=["csv"], key="fleet_file"
+                )
+                if fleet_file is None:
+                    st.info("Upload a fleet file to match every truck at once.")
+                else:
+                    try:
+                        trucks = read_fleet(fleet_file)
+                    except ValueError as e:
+                        st.error(f"Could not read the fleet file: {e}")
+                    else:
+                        with timer.section("tab/matching/fleet"):
+                            matches = matcher.match_fleet(trucks, top_k)
+                        st.caption(f"{len(matches):,} matches for {len(trucks):,} trucks")
+                        best = matches[matches['rank'] == 1].nlargest(25, 'rate_per_total_mile')
+                        timer.plotly_chart('fleet_matches', build_match_figure(best, "Best Load per Truck (Top 25 Trucks)"),
+                                           use_container_width=True)
+                        timer.dataframe('fleet_matches_table', matches, use_container_width=True, hide_index=True)
+                        st.download_button("Download matches", matches.to_csv(index=False), "matches.csv", "text/csv")
     
     # Data table
     st.markdown("---")
     st.header("📋 Data Table")
     
-    # Show filtered data
-    display_columns = [
-        'referenceNumber', 'route', 'equipmentType', 'rate_dollars', 
-        'distanceMiles', 'weight', 'companyName', 'posted_date'
-    ]
+    # Search, sort and paging run here; only the visible page is sent
+    search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    with search_col:
+        query = st.text_input("Search", placeholder="Reference #, route, equipment or company")
+    with sort_col:
+        sort_label = st.selectbox("Sort by", ["None"] + list(TABLE_COLUMNS.values()))
+    with order_col:
+        descending = st.toggle("Descending")
+    with size_col:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES)
     
-    st.dataframe(
-        filtered_df[display_columns].rename(columns={
-            'referenceNumber': 'Reference #',
-            'route': 'Route',
-            'equipmentType': 'Equipment',
-            'rate_dollars': 'Rate ($)',
-            'distanceMiles': 'Distance (miles)',
-            'weight': 'Weight (lbs)',
-            'companyName': 'Company',
-            'posted_date': 'Posted Date'
-        }),
-        use_container_width=True,
-        height=400
-    )
+    sort_column = next((name for name, label in TABLE_COLUMNS.items() if label == sort_label), None)
+    with timer.section("table/search+sort"):
+        table_rows = cached_table_rows(
+            (selection_key, query.strip(), sort_column, descending),
+            lambda: sort_rows(df, search_rows(df, selection_rows(), query), sort_column, ascending=not descending)
+        )
+    
+    total_rows = row_count(df, table_rows)
+    pages = page_count(total_rows, page_size)
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1)
+    page = min(int(page), pages)
+    first = (page - 1) * page_size
+    
+    with timer.section("table/page"):
+        page_df = page_frame(df, table_rows, page, page_size)
+    timer.dataframe('data_table', page_df, use_container_width=True, height=400)
+    st.caption(f"Rows {min(first + 1, total_rows):,}–{min(first + page_size, total_rows):,} "
+               f"of {total_rows:,}")
+    
+    timer.render_panel()
+    timer.log(rows=summary['count'], dataset_version=dataset.version)
 
 if __name__ == "__main__":
     main()
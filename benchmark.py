@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the dashboard's load, filter and render paths
+
+Generates synthetic feeds with create_sample_data at each requested size,
+then times (best of --repeat runs) and measures peak traced memory for:
+loading and enriching the feed, building the indexes, reading the frame
+cache, every combination of sidebar filters, each tab's figures and the
+data table page. Results are written as JSON; with --baseline, each step
+is compared against an earlier results file and regressions make the
+script exit non-zero.
+
+    python benchmark.py --sizes 10000,100000 --output bench.json
+    python benchmark.py --sizes 10000,100000 --baseline bench.json
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from create_sample_data import write_postings
+from data_source import read_enriched_postings, read_postings
+from data_table import page_frame, search_rows, sort_rows
+from dataset import Dataset
+from filter_index import INDEXES
+import frame_cache
+
+DEFAULT_SIZES = "10000,100000"
+
+# Fixed so every run benchmarks the same postings
+SEED = 0
+BASE_TIMESTAMP = 1760000000000
+
+# A step regresses when it is this many times slower than the baseline...
+DEFAULT_THRESHOLD = 1.25
+# ...and slower by at least this many seconds, which filters timer noise
+MIN_REGRESSION_SECONDS = 0.005
+
+FILTERS = ("equipment", "state", "company", "rate_range", "posted_range", "origin_radius")
+
+# Filters the aggregate cube can answer on its own
+CUBE_FILTERS = ("equipment", "state", "company")
+
+# Radius of the origin filter, in miles
+RADIUS_MILES = 100
+
+# Trucks in the batch matching benchmark
+FLEET_SIZE = 1000
+
+HOUR_MS = 3_600_000
+
+
+def measure(step, repeat=1):
+    """Return (best seconds, peak traced MB) for calling step
+
+    Timing runs are untraced; one extra run under tracemalloc gives the
+    peak memory allocated while the step ran.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        step()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1e6
+
+
+def build_indexes(df):
+    """Return a Dataset with every index built up front instead of on first use"""
+    dataset = Dataset(df)
+    for name in INDEXES:
+        getattr(dataset.filter_index, name)
+    dataset.aggregate_engine, dataset.cube, dataset.ids
+    return dataset
+
+
+def feed_path(data_dir, size):
+    """Generate (once) the synthetic JSON Lines feed for a size"""
+    path = os.path.join(data_dir, f"postings-{size}-seed{SEED}.jsonl")
+    if not os.path.exists(path):
+        write_postings(path, size, seed=SEED, base_timestamp=BASE_TIMESTAMP)
+    return path
+
+
+def filter_values(dataset):
+    """Pick a typical value for each sidebar filter: the most common one"""
+    df = dataset.df
+    low, high = dataset.filter_index.rate.value_range()
+    last_posted = int(dataset.filter_index.posted.value_range()[1])
+    origin = df["originCity"].astype(str) + ", " + df["originState"].astype(str)
+    lat, lon = dataset.places().loc[origin.value_counts().index[0], ["lat", "lon"]]
+    return {
+        "equipment": df["equipmentType"].value_counts().index[0],
+        "state": df["originState"].value_counts().index[0],
+        "company": df["companyName"].value_counts().index[0],
+        # The middle half of the slider
+        "rate_range": (low + (high - low) / 4, high - (high - low) / 4),
+        # The dispatchers' usual window
+        "posted_range": (last_posted - 6 * HOUR_MS, last_posted),
+        "origin_radius": (float(lat), float(lon), RADIUS_MILES),
+    }
+
+
+def selections(dataset):
+    """Yield (name, selection) for every combination of active sidebar filters
+
+    Inactive filters take the values the sidebar starts with: 'All', the
+    full rate range, no time range and no radius.
+    """
+    values = filter_values(dataset)
+    defaults = dict(equipment='All', state='All', company='All',
+                    rate_range=dataset.filter_index.rate.value_range(), posted_range=None, origin_radius=None)
+    for count in range(len(FILTERS) + 1):
+        for active in itertools.combinations(FILTERS, count):
+            name = "+".join(active) or "none"
+            yield name, {key: values[key] if key in active else defaults[key] for key in FILTERS}
+
+
+def benchmark_size(size, data_dir, repeat):
+    """Run every benchmark step for one dataset size and return result rows"""
+    # Imported here so the Streamlit module setup only runs when benchmarking
+    import app
+
+    results = []
+
+    def record(name, step, times=repeat):
+        seconds, peak_mb = measure(step, times)
+        results.append({"size": size, "name": name, "seconds": seconds, "peak_mb": peak_mb})
+        print(f"{size:>10,}  {name:<48} {seconds * 1000:10.2f} ms {peak_mb:10.1f} MB")
+
+    path = feed_path(data_dir, size)
+
+    # Loading is slow at large sizes, so it runs once
+    record("load/parse", lambda: read_postings(path), times=1)
+    record("load/parse+enrich", lambda: read_enriched_postings(path), times=1)
+    df = read_enriched_postings(path)
+    record("load/indexes", lambda: build_indexes(df), times=1)
+    dataset = build_indexes(df)
+
+    if frame_cache.cache_enabled():
+        with tempfile.TemporaryDirectory() as cache_dir:
+            previous = os.environ.get(frame_cache.CACHE_DIR_ENV)
+            os.environ[frame_cache.CACHE_DIR_ENV] = cache_dir
+            try:
+                frame_cache.write_cached_frame(path, df)
+                record("load/cached", lambda: frame_cache.read_cached_frame(path))
+            finally:
+                if previous is None:
+                    del os.environ[frame_cache.CACHE_DIR_ENV]
+                else:
+                    os.environ[frame_cache.CACHE_DIR_ENV] = previous
+
+    filter_index = dataset.filter_index
+    engine = dataset.aggregate_engine
+    cube = dataset.cube
+    combinations = dict(selections(dataset))
+    for name, selection in combinations.items():
+        record(f"filter/{name}", lambda: engine.summarize(filter_index.select(**selection)))
+        if all(active in CUBE_FILTERS for active in name.split("+") if active != "none"):
+            # What the dashboard does when only category filters are active
+            record(f"filter/cube/{name}", lambda: cube.summarize(
+                cube.select(selection["equipment"], selection["state"], selection["company"])
+            ))
+
+    # Tabs are timed for the unfiltered view and the narrowest selection
+    for name, selection in [("none", combinations["none"]), ("all", combinations["+".join(FILTERS)])]:
+        rows = filter_index.select(**selection)
+        summary = engine.summarize(rows)
+        filtered_df = df if rows is None else df.take(rows)
+        record(f"tab/geographic/{name}",
+               lambda: app.build_geographic_figures(filtered_df, summary, "Aggregated"))
+        record(f"tab/rate/{name}", lambda: app.build_rate_figures(filtered_df, filter_index, selection))
+        record(f"tab/scatter/{name}", lambda: app.build_scatter_figure(filtered_df, "Auto"))
+        record(f"tab/equipment/{name}", lambda: app.build_equipment_figures(engine, rows, summary))
+        record(f"tab/company/{name}", lambda: app.build_company_figures(summary))
+        record(f"tab/time/{name}", lambda: app.build_time_figures(summary))
+        record(f"table/page/{name}", lambda: page_frame(df, rows, 1, 25))
+        record(f"table/sort+page/{name}",
+               lambda: page_frame(df, sort_rows(df, rows, "rate_dollars", ascending=False), 1, 25))
+        record(f"table/search+page/{name}", lambda: page_frame(df, search_rows(df, rows, "tx"), 1, 25))
+
+    # Truck-to-load matching from the feed's cities, one truck and a fleet
+    places = dataset.places()
+    rng = np.random.default_rng(SEED)
+    picks = rng.integers(0, len(places), FLEET_SIZE)
+    low, high = dataset.filter_index.pickup.value_range()
+    fleet = pd.DataFrame({
+        "truck_id": np.arange(FLEET_SIZE),
+        "lat": places["lat"].to_numpy()[picks] + rng.normal(0, 0.3, FLEET_SIZE),
+        "lon": places["lon"].to_numpy()[picks] + rng.normal(0, 0.3, FLEET_SIZE),
+        "equipment": rng.choice(df["equipmentType"].cat.categories, FLEET_SIZE),
+        "available_at": rng.integers(int(low), int(low + (high - low) / 2) + 1, FLEET_SIZE),
+        "max_deadhead": rng.choice([50, 100, 200], FLEET_SIZE),
+    })
+    matcher = dataset.matcher()
+    truck = fleet.iloc[0]
+    record("match/truck", lambda: matcher.match(truck["lat"], truck["lon"], truck["equipment"],
+                                                 int(truck["available_at"]), truck["max_deadhead"]))
+    record(f"match/fleet-{FLEET_SIZE}", lambda: matcher.match_fleet(fleet))
+
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return the steps that got slower than the baseline, slowest ratio first"""
+    previous = {(row["size"], row["name"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["size"], row["name"]))
+        if before is None:
+            continue
+        ratio = row["seconds"] / before["seconds"] if before["seconds"] > 0 else float("inf")
+        if ratio > threshold and row["seconds"] - before["seconds"] > MIN_REGRESSION_SECONDS:
+            regressions.append({**row, "baseline_seconds": before["seconds"], "ratio": ratio})
+    return sorted(regressions, key=lambda row: -row["ratio"])
+
+
+def run(sizes, data_dir, repeat=3):
+    """Benchmark every size and return the results document"""
+    results = []
+    for size in sizes:
+        results.extend(benchmark_size(size, data_dir, repeat))
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": SEED,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def parse_size(text):
+    """Parse sizes like 10000, 100k or 10M"""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma-separated row counts, e.g. 10k,100k,1M,10M")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per step (best is kept)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown ratio that counts as a regression")
+    parser.add_argument("--data-dir", help="directory for generated feeds (kept between runs)")
+    args = parser.parse_args(argv)
+    if args.baseline and os.path.realpath(args.baseline) == os.path.realpath(args.output):
+        parser.error("--output must differ from --baseline, or the baseline is overwritten before the comparison")
+
+    # Read before anything is written, so a bad path fails fast
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        document = run(sizes, args.data_dir, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            document = run(sizes, data_dir, args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"\nWrote {len(document['results'])} results to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(document["results"], baseline, args.threshold)
+        for row in regressions:
+            print(f"REGRESSION {row['size']:,} {row['name']}: "
+                  f"{row['baseline_seconds'] * 1000:.2f} ms -> {row['seconds'] * 1000:.2f} ms "
+                  f"({row['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
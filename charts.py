@@ -0,0 +1,329 @@
+"""
+Server-side chart data for the Logistics Dashboard
+
+Reduces row-level data to what a chart actually draws before it is handed
+to Plotly, so figure payloads scale with distinct values rather than rows.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Bars per histogram
+HISTOGRAM_BINS = 50
+
+# Outliers drawn per box in the box plots; the rest are only counted
+BOX_MAX_OUTLIERS = 50
+
+# Rate vs Distance scatter: points drawn before sampling kicks in, and the
+# multiple of that budget beyond which Auto switches to a density view
+SCATTER_POINT_BUDGET_ENV = "DASHBOARD_SCATTER_POINT_BUDGET"
+DEFAULT_SCATTER_POINT_BUDGET = 20000
+SCATTER_DENSITY_FACTOR = 10
+
+# Share of the sample reserved for outliers, and the tail quantile that
+# makes a point an outlier on either axis
+SCATTER_OUTLIER_SHARE = 0.1
+SCATTER_OUTLIER_QUANTILE = 0.005
+
+# Cells per axis in the density view
+DENSITY_BINS = 60
+
+# Above this many distinct locations the load map switches to grid cells
+MAP_GRID_THRESHOLD_ENV = "DASHBOARD_MAP_GRID_THRESHOLD"
+DEFAULT_MAP_GRID_THRESHOLD = 2000
+
+# Grid cell size in degrees of latitude/longitude
+MAP_CELL_DEGREES = 0.5
+
+# Marker size range (pixels) for aggregated map points
+MAP_MIN_MARKER = 6
+MAP_MAX_MARKER = 30
+
+
+def map_grid_threshold():
+    return int(os.environ.get(MAP_GRID_THRESHOLD_ENV) or DEFAULT_MAP_GRID_THRESHOLD)
+
+
+def map_points(df, prefix, grid_threshold=None, cell_degrees=MAP_CELL_DEGREES):
+    """Aggregate origin or destination coordinates into counted map points
+
+    prefix is 'origin' or 'destination'. Rows sharing a coordinate become
+    one point labelled with its city. When there are more distinct
+    coordinates than grid_threshold, locations are further binned into
+    cell_degrees grid cells placed at their load-weighted centroid.
+
+    Returns (points, mode) where points has lat, lon, count and label
+    columns and mode is 'locations' or 'grid'.
+    """
+    if grid_threshold is None:
+        grid_threshold = map_grid_threshold()
+
+    lat = df[f'{prefix}Latitude'].to_numpy(dtype=np.float64)
+    lon = df[f'{prefix}Longitude'].to_numpy(dtype=np.float64)
+    present = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+    lat, lon = lat[present], lon[present]
+
+    # Factorize each axis, then the (lat, lon) pair, without sorting the rows
+    lat_codes, lat_values = pd.factorize(lat)
+    lon_codes, lon_values = pd.factorize(lon)
+    pair_codes, pair_keys = pd.factorize(lat_codes.astype(np.int64) * len(lon_values) + lon_codes)
+    _, first_rows = np.unique(pair_codes, return_index=True)
+
+    locations = pd.DataFrame({
+        'lat': lat_values[pair_keys // max(len(lon_values), 1)],
+        'lon': lon_values[pair_keys % max(len(lon_values), 1)],
+        'count': np.bincount(pair_codes, minlength=len(pair_keys)),
+    })
+
+    if len(locations) <= grid_threshold:
+        # Label each location with the city of its first row
+        label_rows = present[first_rows]
+        cities = df[f'{prefix}City'].iloc[label_rows].astype(str).to_numpy()
+        states = df[f'{prefix}State'].iloc[label_rows].astype(str).to_numpy()
+        locations['label'] = [f"{city}, {state}" for city, state in zip(cities, states)]
+        return locations, 'locations'
+
+    # Bin the distinct locations (not the rows) into grid cells
+    locations['cell_lat'] = np.floor(locations['lat'] / cell_degrees)
+    locations['cell_lon'] = np.floor(locations['lon'] / cell_degrees)
+    locations['lat_weight'] = locations['lat'] * locations['count']
+    locations['lon_weight'] = locations['lon'] * locations['count']
+    cells = locations.groupby(['cell_lat', 'cell_lon'], sort=False).agg(
+        count=('count', 'sum'),
+        lat_weight=('lat_weight', 'sum'),
+        lon_weight=('lon_weight', 'sum'),
+        locations=('count', 'size'),
+    )
+    grid = pd.DataFrame({
+        'lat': cells['lat_weight'].to_numpy() / cells['count'].to_numpy(),
+        'lon': cells['lon_weight'].to_numpy() / cells['count'].to_numpy(),
+        'count': cells['count'].to_numpy(),
+        'label': [f"{n:,} location{'s' if n != 1 else ''}" for n in cells['locations'].to_numpy()],
+    })
+    return grid, 'grid'
+
+
+def marker_sizes(counts, max_count=None):
+    """Scale marker diameters with the square root of the load count"""
+    counts = np.asarray(counts, dtype=np.float64)
+    if max_count is None:
+        max_count = counts.max() if counts.size else 1.0
+    scale = np.sqrt(counts / max(max_count, 1.0))
+    return MAP_MIN_MARKER + (MAP_MAX_MARKER - MAP_MIN_MARKER) * scale
+
+
+def _bin_edges(low, high, bins):
+    # Same convention as np.histogram for a degenerate range
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def histogram_counts(values, bins=HISTOGRAM_BINS):
+    """Bin values server-side, ignoring NaNs; returns (counts, edges)"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1)
+    return np.histogram(values, bins=_bin_edges(values.min(), values.max(), bins))
+
+
+def sorted_histogram_counts(sorted_values, start, stop, bins=HISTOGRAM_BINS):
+    """Bin sorted_values[start:stop] using only binary searches
+
+    Because the values are already sorted, the number of values below any
+    edge is a searchsorted position, so each bin count is a difference of
+    two such cumulative counts and no row is touched.
+    """
+    if stop <= start:
+        return np.zeros(0, dtype=np.int64), np.zeros(1)
+    window = sorted_values[start:stop]
+    edges = _bin_edges(window[0], window[-1], bins)
+    # Bins are half-open except the last, matching np.histogram
+    below = np.searchsorted(window, edges[1:-1], side='left')
+    cumulative = np.concatenate(([0], below, [len(window)]))
+    return np.diff(cumulative), edges
+
+
+def histogram_figure(counts, edges, title, x_label, y_label='Number of Loads'):
+    """Draw pre-binned counts as a bar trace whose size depends only on the bin count"""
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]) if len(counts) else None,
+        hovertemplate='%{customdata[0]:,.2f} - %{customdata[1]:,.2f}<br>%{y:,}<extra></extra>',
+    ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, bargap=0)
+    return fig
+
+
+def _sorted_quantile(values, q):
+    """Linear-interpolated quantile of an already sorted array"""
+    position = (len(values) - 1) * q
+    below = int(np.floor(position))
+    above = min(below + 1, len(values) - 1)
+    return values[below] + (values[above] - values[below]) * (position - below)
+
+
+def box_stats(sorted_values, bounds, labels, max_outliers=BOX_MAX_OUTLIERS):
+    """Compute box plot statistics for values sorted within each group
+
+    Group g's values are sorted_values[bounds[g]:bounds[g + 1]]. Whiskers
+    reach the furthest values within 1.5 IQR of the quartiles; at most
+    max_outliers of the values beyond them are kept, evenly spread over
+    the sorted outliers so the extremes are always included.
+    """
+    stats = []
+    for code, label in enumerate(labels):
+        values = sorted_values[bounds[code]:bounds[code + 1]]
+        if len(values) == 0:
+            continue
+        q1, median, q3 = (_sorted_quantile(values, q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        low = np.searchsorted(values, q1 - 1.5 * iqr, side='left')
+        high = np.searchsorted(values, q3 + 1.5 * iqr, side='right')
+        outliers = np.concatenate([values[:low], values[high:]])
+        if len(outliers) > max_outliers:
+            outliers = outliers[np.linspace(0, len(outliers) - 1, max_outliers).round().astype(np.int64)]
+        stats.append({
+            'label': label,
+            'count': len(values),
+            'q1': q1,
+            'median': median,
+            'q3': q3,
+            'lower_fence': values[low],
+            'upper_fence': values[high - 1],
+            'outlier_count': int(low + len(values) - high),
+            'outliers': outliers,
+        })
+    return stats
+
+
+def box_figure(stats, title, x_label, y_label):
+    """Draw precomputed box statistics, so the figure size depends on the group count"""
+    labels = [str(group['label']) for group in stats]
+    fig = go.Figure(go.Box(
+        x=labels,
+        q1=[group['q1'] for group in stats],
+        median=[group['median'] for group in stats],
+        q3=[group['q3'] for group in stats],
+        lowerfence=[group['lower_fence'] for group in stats],
+        upperfence=[group['upper_fence'] for group in stats],
+        name=y_label,
+        showlegend=False,
+    ))
+    outlier_x = [label for label, group in zip(labels, stats) for _ in group['outliers']]
+    if outlier_x:
+        fig.add_trace(go.Scatter(
+            x=outlier_x,
+            y=np.concatenate([group['outliers'] for group in stats]),
+            mode='markers',
+            name='Outliers',
+            marker=dict(size=4),
+            showlegend=False,
+        ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label)
+    return fig
+
+
+def scatter_point_budget():
+    return int(os.environ.get(SCATTER_POINT_BUDGET_ENV) or DEFAULT_SCATTER_POINT_BUDGET)
+
+
+def choose_scatter_mode(n_points, budget, requested='Auto'):
+    """Resolve the scatter mode: 'points', 'sample' or 'density'"""
+    if requested == 'Sample':
+        return 'sample' if n_points > budget else 'points'
+    if requested == 'Density':
+        return 'density'
+    if n_points <= budget:
+        return 'points'
+    if n_points <= budget * SCATTER_DENSITY_FACTOR:
+        return 'sample'
+    return 'density'
+
+
+def stratified_sample(groups, x, y, budget, seed=0):
+    """Pick at most budget row positions, keeping group proportions and outliers
+
+    groups holds integer group codes (e.g. equipment type). Points in the
+    outer SCATTER_OUTLIER_QUANTILE tails of x or y are kept first, up to
+    SCATTER_OUTLIER_SHARE of the budget; the rest of the budget is split
+    across groups in proportion to their size.
+    """
+    groups = np.asarray(groups)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(groups)
+    if n <= budget:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+
+    # Outliers on either axis
+    outlier = np.zeros(n, dtype=bool)
+    for values in (x, y):
+        low, high = np.nanquantile(values, [SCATTER_OUTLIER_QUANTILE, 1 - SCATTER_OUTLIER_QUANTILE])
+        outlier |= (values < low) | (values > high)
+    outliers = np.flatnonzero(outlier)
+    max_outliers = int(budget * SCATTER_OUTLIER_SHARE)
+    if len(outliers) > max_outliers:
+        outliers = rng.choice(outliers, max_outliers, replace=False)
+
+    # Proportional quotas per group (largest remainder) for the remaining rows
+    remaining = np.ones(n, dtype=bool)
+    remaining[outliers] = False
+    group_values, group_codes = np.unique(groups[remaining], return_inverse=True)
+    sizes = np.bincount(group_codes, minlength=len(group_values))
+    slots = budget - len(outliers)
+    exact = sizes * slots / max(sizes.sum(), 1)
+    quotas = np.floor(exact).astype(np.int64)
+    leftover = slots - quotas.sum()
+    if leftover > 0:
+        quotas[np.argsort(quotas - exact, kind='stable')[:leftover]] += 1
+    quotas = np.minimum(quotas, sizes)
+
+    candidates = np.flatnonzero(remaining)
+    picks = [outliers]
+    for code, quota in enumerate(quotas):
+        if quota:
+            members = candidates[group_codes == code]
+            picks.append(rng.choice(members, quota, replace=False))
+    return np.sort(np.concatenate(picks))
+
+
+def density_figure(groups, labels, x, y, title, x_label, y_label, bins=DENSITY_BINS):
+    """Draw one 2D count heatmap per group on shared axes, binned server-side"""
+    from plotly.subplots import make_subplots
+
+    groups = np.asarray(groups)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    present = ~(np.isnan(x) | np.isnan(y))
+    x_edges = _bin_edges(np.min(x[present]), np.max(x[present]), bins) if present.any() else _bin_edges(0, 1, bins)
+    y_edges = _bin_edges(np.min(y[present]), np.max(y[present]), bins) if present.any() else _bin_edges(0, 1, bins)
+
+    codes = [code for code in range(len(labels)) if np.any(present & (groups == code))]
+    fig = make_subplots(
+        rows=1, cols=max(len(codes), 1), shared_yaxes=True,
+        subplot_titles=[str(labels[code]) for code in codes],
+    )
+    for column, code in enumerate(codes, start=1):
+        member = present & (groups == code)
+        counts, _, _ = np.histogram2d(x[member], y[member], bins=(x_edges, y_edges))
+        fig.add_trace(go.Heatmap(
+            x=(x_edges[:-1] + x_edges[1:]) / 2,
+            y=(y_edges[:-1] + y_edges[1:]) / 2,
+            z=np.where(counts.T > 0, counts.T, np.nan),
+            coloraxis='coloraxis',
+            name=str(labels[code]),
+            hovertemplate=f'{x_label}: %{{x:,.0f}}<br>{y_label}: %{{y:,.0f}}<br>Loads: %{{z:,}}<extra></extra>',
+        ), row=1, col=column)
+        fig.update_xaxes(title_text=x_label, row=1, col=column)
+    fig.update_yaxes(title_text=y_label, row=1, col=1)
+    fig.update_layout(title=title, coloraxis=dict(colorscale='Viridis', colorbar=dict(title='Loads')))
+    return fig
@@ -1,52 +1,94 @@
 #!/usr/bin/env python3
 """
 Script to create a comprehensive sample dataset for the Logistics Dashboard
+
+generate_sample_data() builds a small dump of posting dicts. For load
+testing, iter_posting_chunks() draws postings column-wise with a seeded
+NumPy generator, a chunk at a time, with production-like skew: a few hot
+lanes and dominant carriers take most of the volume and postings follow
+a business-hours daily cycle. write_postings() streams those chunks to
+JSON Lines or an Arrow IPC file without holding the whole dataset.
 """
 
+import argparse
 import json
 import random
 from datetime import datetime, timedelta
 
+import numpy as np
+import pandas as pd
+
+from geo import road_miles
+
+# Sample cities and states with coordinates
+CITIES = [
+    {"city": "Chicago", "state": "IL", "lat": 41.8781, "lon": -87.6298},
+    {"city": "New York", "state": "NY", "lat": 40.7128, "lon": -74.0060},
+    {"city": "Los Angeles", "state": "CA", "lat": 34.0522, "lon": -118.2437},
+    {"city": "Houston", "state": "TX", "lat": 29.7604, "lon": -95.3698},
+    {"city": "Phoenix", "state": "AZ", "lat": 33.4484, "lon": -112.0740},
+    {"city": "Philadelphia", "state": "PA", "lat": 39.9526, "lon": -75.1652},
+    {"city": "San Antonio", "state": "TX", "lat": 29.4241, "lon": -98.4936},
+    {"city": "San Diego", "state": "CA", "lat": 32.7157, "lon": -117.1611},
+    {"city": "Dallas", "state": "TX", "lat": 32.7767, "lon": -96.7970},
+    {"city": "San Jose", "state": "CA", "lat": 37.3382, "lon": -121.8863},
+    {"city": "Austin", "state": "TX", "lat": 30.2672, "lon": -97.7431},
+    {"city": "Jacksonville", "state": "FL", "lat": 30.3322, "lon": -81.6557},
+    {"city": "Fort Worth", "state": "TX", "lat": 32.7555, "lon": -97.3308},
+    {"city": "Columbus", "state": "OH", "lat": 39.9612, "lon": -82.9988},
+    {"city": "Charlotte", "state": "NC", "lat": 35.2271, "lon": -80.8431},
+    {"city": "San Francisco", "state": "CA", "lat": 37.7749, "lon": -122.4194},
+    {"city": "Indianapolis", "state": "IN", "lat": 39.7684, "lon": -86.1581},
+    {"city": "Seattle", "state": "WA", "lat": 47.6062, "lon": -122.3321},
+    {"city": "Denver", "state": "CO", "lat": 39.7392, "lon": -104.9903},
+    {"city": "Washington", "state": "DC", "lat": 38.9072, "lon": -77.0369}
+]
+
+EQUIPMENT_TYPES = ["Dry Van", "Reefer", "Flatbed", "Power Only"]
+COMPANIES = [
+    "Koola Logistics LLC",
+    "Surge Transportation", 
+    "JB Hunt",
+    "Swift Transportation",
+    "Schneider National",
+    "Werner Enterprises",
+    "Knight Transportation",
+    "Prime Inc",
+    "Covenant Transport",
+    "USA Truck"
+]
+
+# Share of loads per equipment type, and its effect on the per-mile rate
+EQUIPMENT_SHARES = [0.55, 0.2, 0.15, 0.1]
+EQUIPMENT_RATE_FACTORS = [1.0, 1.2, 1.12, 0.85]
+
+# Zipf exponents for lane and carrier popularity; higher means more skew
+LANE_SKEW = 0.9
+CARRIER_SKEW = 1.0
+
+# Relative posting volume per hour of day: quiet overnight, a morning peak
+# and a smaller mid-afternoon one
+HOURLY_POSTING_WEIGHTS = [
+    1, 1, 1, 1, 2, 4, 8, 14, 18, 20, 18, 14,
+    11, 13, 15, 14, 11, 8, 6, 4, 3, 2, 1, 1,
+]
+
+# Days of posting history generated before the base timestamp
+HISTORY_DAYS = 7
+
+# Postings per generated chunk
+CHUNK_SIZE = 100_000
+
+FIRST_ID = 568188000
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
 def generate_sample_data(num_records=100):
     """Generate comprehensive sample logistics data"""
-    
-    # Sample cities and states with coordinates
-    cities = [
-        {"city": "Chicago", "state": "IL", "lat": 41.8781, "lon": -87.6298},
-        {"city": "New York", "state": "NY", "lat": 40.7128, "lon": -74.0060},
-        {"city": "Los Angeles", "state": "CA", "lat": 34.0522, "lon": -118.2437},
-        {"city": "Houston", "state": "TX", "lat": 29.7604, "lon": -95.3698},
-        {"city": "Phoenix", "state": "AZ", "lat": 33.4484, "lon": -112.0740},
-        {"city": "Philadelphia", "state": "PA", "lat": 39.9526, "lon": -75.1652},
-        {"city": "San Antonio", "state": "TX", "lat": 29.4241, "lon": -98.4936},
-        {"city": "San Diego", "state": "CA", "lat": 32.7157, "lon": -117.1611},
-        {"city": "Dallas", "state": "TX", "lat": 32.7767, "lon": -96.7970},
-        {"city": "San Jose", "state": "CA", "lat": 37.3382, "lon": -121.8863},
-        {"city": "Austin", "state": "TX", "lat": 30.2672, "lon": -97.7431},
-        {"city": "Jacksonville", "state": "FL", "lat": 30.3322, "lon": -81.6557},
-        {"city": "Fort Worth", "state": "TX", "lat": 32.7555, "lon": -97.3308},
-        {"city": "Columbus", "state": "OH", "lat": 39.9612, "lon": -82.9988},
-        {"city": "Charlotte", "state": "NC", "lat": 35.2271, "lon": -80.8431},
-        {"city": "San Francisco", "state": "CA", "lat": 37.7749, "lon": -122.4194},
-        {"city": "Indianapolis", "state": "IN", "lat": 39.7684, "lon": -86.1581},
-        {"city": "Seattle", "state": "WA", "lat": 47.6062, "lon": -122.3321},
-        {"city": "Denver", "state": "CO", "lat": 39.7392, "lon": -104.9903},
-        {"city": "Washington", "state": "DC", "lat": 38.9072, "lon": -77.0369}
-    ]
-    
-    equipment_types = ["Dry Van", "Reefer", "Flatbed", "Power Only"]
-    companies = [
-        "Koola Logistics LLC",
-        "Surge Transportation", 
-        "JB Hunt",
-        "Swift Transportation",
-        "Schneider National",
-        "Werner Enterprises",
-        "Knight Transportation",
-        "Prime Inc",
-        "Covenant Transport",
-        "USA Truck"
-    ]
+    cities = CITIES
+    equipment_types = EQUIPMENT_TYPES
+    companies = COMPANIES
     
     load_postings = []
     
@@ -62,10 +104,8 @@ def generate_sample_data(num_records=100):
         while destination == origin:
             destination = random.choice(cities)
         
-        # Calculate distance (rough approximation)
-        lat_diff = abs(origin["lat"] - destination["lat"])
-        lon_diff = abs(origin["lon"] - destination["lon"])
-        distance = int((lat_diff + lon_diff) * 100)  # Rough miles
+        # Estimated road miles along the great circle
+        distance = int(road_miles(origin["lat"], origin["lon"], destination["lat"], destination["lon"]))
         
         # Generate realistic rates based on distance
         base_rate = distance * random.uniform(1.5, 3.0)  # $1.5-3.0 per mile
@@ -123,16 +163,174 @@ def generate_sample_data(num_records=100):
         "total": len(load_postings)
     }
 
+def _zipf_weights(size, skew, rng):
+    """Popularity weights proportional to 1 / rank**skew, in a random rank order"""
+    weights = 1.0 / np.arange(1, size + 1) ** skew
+    return rng.permutation(weights / weights.sum())
+
+def _prefixed(prefix, numbers, suffix=""):
+    return np.char.add(np.char.add(prefix, numbers.astype(str)), suffix).astype(object)
+
+def iter_posting_chunks(num_records, chunk_size=CHUNK_SIZE, seed=0, base_timestamp=None):
+    """Yield DataFrames of synthetic postings, chunk_size rows at a time
+
+    The output is fully determined by seed, chunk_size and base_timestamp
+    (which defaults to now). Lane and carrier popularity are drawn once
+    from the seed and shared by every chunk.
+    """
+    rng = np.random.default_rng(seed)
+    if base_timestamp is None:
+        base_timestamp = int(datetime.now().timestamp() * 1000)
+
+    latitudes = np.array([city["lat"] for city in CITIES])
+    longitudes = np.array([city["lon"] for city in CITIES])
+    city_names = np.array([city["city"] for city in CITIES], dtype=object)
+    state_names = np.array([city["state"] for city in CITIES], dtype=object)
+
+    # Every ordered pair of distinct cities is a lane
+    origins, destinations = np.nonzero(~np.eye(len(CITIES), dtype=bool))
+    lane_weights = _zipf_weights(len(origins), LANE_SKEW, rng)
+    lane_miles = road_miles(
+        latitudes[origins], longitudes[origins], latitudes[destinations], longitudes[destinations]
+    )
+
+    carrier_weights = _zipf_weights(len(COMPANIES), CARRIER_SKEW, rng)
+    companies = np.array(COMPANIES, dtype=object)
+    emails = np.array(
+        [f"ops@{company.lower().replace(' ', '').replace('.', '')}.com" for company in COMPANIES],
+        dtype=object,
+    )
+    equipment = np.array(EQUIPMENT_TYPES, dtype=object)
+    rate_factors = np.array(EQUIPMENT_RATE_FACTORS)
+    hour_weights = np.array(HOURLY_POSTING_WEIGHTS, dtype=np.float64)
+    hour_weights /= hour_weights.sum()
+    window_start = (base_timestamp // DAY_MS - (HISTORY_DAYS - 1)) * DAY_MS
+
+    for start in range(0, num_records, chunk_size):
+        n = min(chunk_size, num_records - start)
+        serial = np.arange(start, start + n, dtype=np.int64)
+
+        lane = rng.choice(len(origins), size=n, p=lane_weights)
+        origin, destination = origins[lane], destinations[lane]
+        distance = np.maximum(lane_miles[lane] * rng.uniform(0.97, 1.05, n), 1).astype(np.int64)
+        kind = rng.choice(len(EQUIPMENT_TYPES), size=n, p=EQUIPMENT_SHARES)
+        carrier = rng.choice(len(COMPANIES), size=n, p=carrier_weights)
+
+        # Per-mile rates are log-normal, higher for short hauls and special equipment
+        per_mile = (rng.lognormal(np.log(2.2), 0.25, n) * rate_factors[kind]
+                    * (1 + 150 / (distance + 150)))
+        rate_cents = (distance * per_mile * 100).astype(np.int64)
+
+        day = rng.integers(0, HISTORY_DAYS, n)
+        hour = rng.choice(24, size=n, p=hour_weights)
+        posted = window_start + day * DAY_MS + hour * HOUR_MS + rng.integers(0, HOUR_MS, n)
+        # Most pickups are the same or next day, a few up to three days out
+        lead_hours = np.clip(rng.lognormal(np.log(18), 0.7, n), 1, 72)
+        pickup = posted + (lead_hours * HOUR_MS).astype(np.int64)
+
+        missing = np.full(n, None, dtype=object)
+        phone = rng.integers(2000000000, 10000000000, n)
+        yield pd.DataFrame({
+            "id": FIRST_ID + serial,
+            "referenceNumber": _prefixed("REF", 100000 + serial),
+            "trackingNumber": _prefixed("TRK", 100000 + serial),
+            "postedTimestamp": posted,
+            "pickupTimestamp": pickup,
+            "dropoffTimestamp": missing,
+            "comments": _prefixed("Load ", serial + 1, " - Standard delivery"),
+            "rateCents": rate_cents,
+            "rateCentsPerMile": rate_cents // distance,
+            "originKey": rng.integers(-2000000000, 2000000000, n),
+            "originCity": city_names[origin],
+            "originState": state_names[origin],
+            "originLatitude": latitudes[origin],
+            "originLongitude": longitudes[origin],
+            "destinationKey": rng.integers(-2000000000, 2000000000, n),
+            "destinationCity": city_names[destination],
+            "destinationState": state_names[destination],
+            "destinationLatitude": latitudes[destination],
+            "destinationLongitude": longitudes[destination],
+            "distanceMiles": distance,
+            "originDeadhead": missing,
+            "destinationDeadhead": missing,
+            "equipmentType": equipment[kind],
+            "weight": rng.integers(10000, 45001, n),
+            "length": np.where(rng.random(n) < 0.8, 53, 48),
+            "dotNumber": rng.integers(1000000, 10000000, n).astype(str).astype(object),
+            "mcNumber": rng.integers(100000, 1000000, n).astype(str).astype(object),
+            "companyName": companies[carrier],
+            "companyEmail": emails[carrier],
+            "companyPhone": _format_phones(phone),
+            "contactName": missing,
+            "contactEmail": missing,
+            "contactPhone": phone.astype(str).astype(object),
+            "value": rng.uniform(0.05, 0.5, n),
+            "viewed": rng.random(n) < 0.5,
+            "credit": rng.random(n) < 0.5,
+        })
+
+def _format_phones(numbers):
+    """Format 10-digit numbers as (AAA) BBB-CCCC"""
+    area, rest = np.divmod(numbers, 10_000_000)
+    exchange, line = np.divmod(rest, 10_000)
+    formatted = np.char.add(np.char.add("(", area.astype(str)), ") ")
+    formatted = np.char.add(formatted, np.char.zfill(exchange.astype(str), 3))
+    formatted = np.char.add(np.char.add(formatted, "-"), np.char.zfill(line.astype(str), 4))
+    return formatted.astype(object)
+
+def write_postings(path, num_records, chunk_size=CHUNK_SIZE, seed=0, base_timestamp=None):
+    """Stream synthetic postings to a .jsonl or .arrow file, one chunk at a time
+
+    Returns the number of postings written.
+    """
+    chunks = iter_posting_chunks(num_records, chunk_size, seed, base_timestamp)
+    if path.lower().endswith(".arrow"):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        writer = None
+        try:
+            for chunk in chunks:
+                batch = pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = ipc.new_file(path, batch.schema)
+                writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return num_records
+
+    with open(path, "w", encoding="utf-8") as handle:
+        for chunk in chunks:
+            lines = chunk.to_json(orient="records", lines=True)
+            handle.write(lines if lines.endswith("\n") else lines + "\n")
+    return num_records
+
+
 if __name__ == "__main__":
-    # Generate 100 sample records
-    sample_data = generate_sample_data(100)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100, help="number of postings to generate")
+    parser.add_argument("--output", default="sample_data.json",
+                        help="output file; .jsonl and .arrow are streamed in chunks")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.output.lower().endswith((".jsonl", ".arrow")):
+        write_postings(args.output, args.records, args.chunk_size, args.seed)
+        print(f"Generated {args.records:,} sample load postings")
+        print(f"Saved to {args.output}")
+        raise SystemExit
+
+    # Generate the sample records
+    sample_data = generate_sample_data(args.records)
     
     # Save to file
-    with open('sample_data.json', 'w') as f:
+    with open(args.output, 'w') as f:
         json.dump(sample_data, f, indent=2)
     
     print(f"Generated {len(sample_data['load_postings'])} sample load postings")
-    print("Saved to sample_data.json")
+    print(f"Saved to {args.output}")
     
     # Print summary
     companies = set(post['companyName'] for post in sample_data['load_postings'])
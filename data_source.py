@@ -0,0 +1,560 @@
+"""
+Data source helpers for the Logistics Dashboard
+
+Reads load postings from JSON dumps, JSON Lines files or directories of
+either, streaming each record straight into typed column buffers so the
+full list of posting dicts is never held in memory. Sources with several
+files are parsed across a process pool.
+"""
+
+import json
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from geo import lane_miles
+
+# Environment variable used when no source is passed to load_data(). Several
+# files or directories can be listed, separated by os.pathsep.
+DATA_SOURCE_ENV = "DASHBOARD_DATA_SOURCE"
+
+# Processes used to parse multi-file sources; defaults to the CPU count
+PARSE_WORKERS_ENV = "DASHBOARD_PARSE_WORKERS"
+
+# File extensions picked up when the source is a directory
+JSON_EXTENSIONS = (".json",)
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+
+# Low-cardinality columns stored as pandas categoricals. Columns grouped
+# together share a single category dictionary.
+CATEGORY_GROUPS = [
+    ["equipmentType"],
+    ["companyName"],
+    ["originState", "destinationState"],
+    ["originCity", "destinationCity"],
+]
+
+# Integer columns downcast to the smallest width that holds their values
+DOWNCAST_INTEGER_COLUMNS = ["weight", "length", "distanceMiles", "rateCents"]
+
+# Characters read from disk per chunk while streaming a JSON dump
+CHUNK_SIZE = 1 << 20
+
+# Column kinds for the load_postings feed. "dict" columns are repetitive
+# strings that are dictionary-encoded while parsing so every row shares
+# the same string object.
+COLUMN_SCHEMA = {
+    "id": "int",
+    "referenceNumber": "str",
+    "trackingNumber": "str",
+    "postedTimestamp": "int",
+    "pickupTimestamp": "int",
+    "dropoffTimestamp": "float",
+    "comments": "str",
+    "rateCents": "int",
+    "rateCentsPerMile": "int",
+    "originKey": "int",
+    "originCity": "dict",
+    "originState": "dict",
+    "originLatitude": "float",
+    "originLongitude": "float",
+    "destinationKey": "int",
+    "destinationCity": "dict",
+    "destinationState": "dict",
+    "destinationLatitude": "float",
+    "destinationLongitude": "float",
+    "distanceMiles": "int",
+    "originDeadhead": "float",
+    "destinationDeadhead": "float",
+    "equipmentType": "dict",
+    "weight": "int",
+    "length": "int",
+    "dotNumber": "dict",
+    "mcNumber": "dict",
+    "companyName": "dict",
+    "companyEmail": "dict",
+    "companyPhone": "dict",
+    "contactName": "dict",
+    "contactEmail": "dict",
+    "contactPhone": "dict",
+    "value": "float",
+    "viewed": "bool",
+    "credit": "bool",
+}
+
+
+class ColumnBuffers:
+    """Append-only typed buffers, one per posting column"""
+
+    def __init__(self, schema=COLUMN_SCHEMA):
+        self.kinds = {}
+        self.buffers = {}
+        self.nulls = {}
+        self.dictionaries = {}
+        self.length = 0
+        for name, kind in schema.items():
+            self._add_column(name, kind)
+
+    def _add_column(self, name, kind):
+        self.kinds[name] = kind
+        self.nulls[name] = []
+        if kind == "int":
+            self.buffers[name] = array("q", bytes(8 * self.length))
+        elif kind == "float":
+            self.buffers[name] = array("d", [np.nan]) * self.length
+        elif kind == "bool":
+            self.buffers[name] = array("b", bytes(self.length))
+        elif kind == "dict":
+            self.dictionaries[name] = {}
+            self.buffers[name] = array("i", [-1]) * self.length
+        else:
+            self.buffers[name] = [None] * self.length
+
+    def _promote_to_float(self, name):
+        """Switch an int column to float once a fractional value shows up"""
+        buffer = array("d", self.buffers[name])
+        for row in self.nulls[name]:
+            buffer[row] = np.nan
+        self.buffers[name] = buffer
+        self.nulls[name] = []
+        self.kinds[name] = "float"
+
+    def append(self, record):
+        """Append one posting dict to the buffers"""
+        row = self.length
+        for name in record.keys() - self.kinds.keys():
+            # Unknown keys become plain object columns
+            self._add_column(name, "object")
+
+        for name, kind in self.kinds.items():
+            value = record.get(name)
+            buffer = self.buffers[name]
+            if kind == "dict":
+                if value is None:
+                    buffer.append(-1)
+                else:
+                    codes = self.dictionaries[name]
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(codes)
+                    buffer.append(code)
+            elif kind == "float":
+                buffer.append(np.nan if value is None else float(value))
+            elif kind == "int" or kind == "bool":
+                if value is None:
+                    self.nulls[name].append(row)
+                    buffer.append(0)
+                elif kind == "int" and isinstance(value, float):
+                    self._promote_to_float(name)
+                    self.buffers[name].append(value)
+                else:
+                    buffer.append(value)
+            else:
+                buffer.append(value)
+        self.length += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+        return self
+
+    def _finish_column(self, name):
+        kind = self.kinds[name]
+        buffer = self.buffers.pop(name)
+        nulls = self.nulls.pop(name)
+        if kind == "int":
+            values = np.array(buffer, dtype=np.int64)
+            if nulls:
+                values = values.astype(np.float64)
+                values[nulls] = np.nan
+        elif kind == "float":
+            values = np.array(buffer, dtype=np.float64)
+        elif kind == "bool":
+            values = np.array(buffer, dtype=bool)
+            if nulls:
+                values = values.astype(object)
+                values[nulls] = None
+        elif kind == "dict":
+            codes = np.array(buffer, dtype=np.int32)
+            uniques = np.empty(len(self.dictionaries[name]) + 1, dtype=object)
+            uniques[:-1] = list(self.dictionaries.pop(name))
+            # Code -1 (missing) picks up the trailing None
+            values = uniques[codes]
+        else:
+            values = np.empty(len(buffer), dtype=object)
+            values[:] = buffer
+        return values
+
+    def to_frame(self):
+        """Build a DataFrame, releasing each buffer as its column is built"""
+        columns = {}
+        for name in list(self.kinds):
+            columns[name] = self._finish_column(name)
+        self.length = 0
+        return pd.DataFrame(columns, copy=False)
+
+
+# Characters that may follow a complete JSON value
+VALUE_DELIMITERS = ",}]: \t\r\n"
+
+
+class _JsonStream:
+    """Incremental reader over a JSON text file"""
+
+    def __init__(self, handle, chunk_size=CHUNK_SIZE):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.handle.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop consumed text before growing the buffer
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, or '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self.pos += 1
+
+    def decode(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number is only complete once a delimiter follows it: "12." or
+            # "12e" at the end of a chunk would otherwise decode as 12
+            complete = end < len(self.buffer) and self.buffer[end] in VALUE_DELIMITERS
+            if not complete and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """Yield the items of the array starting at the current position"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Malformed JSON array, found {separator!r}")
+
+
+def iter_json_postings(path, chunk_size=CHUNK_SIZE):
+    """Stream postings from a dump shaped like {"load_postings": [...]} or a bare array"""
+    with open(path, "r", encoding="utf-8") as handle:
+        stream = _JsonStream(handle, chunk_size)
+        start = stream.peek()
+        if start == "[":
+            yield from stream.iter_array()
+            return
+
+        stream.expect("{")
+        while stream.peek() != "}":
+            key = stream.decode()
+            stream.expect(":")
+            if key == "load_postings":
+                yield from stream.iter_array()
+            else:
+                # Small metadata such as timestamp/total
+                stream.decode()
+            if stream.peek() == ",":
+                stream.pos += 1
+
+
+def iter_jsonl_postings(path):
+    """Stream postings from a JSON Lines file (one posting or one dump per line)
+
+    An unterminated last line that does not parse is still being written
+    and is skipped; the watcher reads it once it is complete.
+    """
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            complete = line.endswith("\n")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if complete:
+                    raise
+                return
+            if "load_postings" in record:
+                yield from record["load_postings"]
+            else:
+                yield record
+
+
+def read_jsonl_tail(path, offset=0):
+    """Read the complete JSON Lines postings after a byte offset
+
+    Returns the postings and the offset just past the last complete line,
+    so a line that is still being written is read by the next call.
+    """
+    postings = []
+    with open(path, "rb") as handle:
+        handle.seek(offset)
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "load_postings" in record:
+                postings.extend(record["load_postings"])
+            else:
+                postings.append(record)
+    return postings, offset
+
+
+def complete_line_offset(path, size, block_size=CHUNK_SIZE):
+    """Return the offset just past the last newline in the first size bytes of a file"""
+    with open(path, "rb") as handle:
+        end = size
+        while end > 0:
+            start = max(0, end - block_size)
+            handle.seek(start)
+            found = handle.read(end - start).rfind(b"\n")
+            if found >= 0:
+                return start + found + 1
+            end = start
+    return 0
+
+
+def list_source_files(source):
+    """Expand a file, directory or list of either into an ordered list of data files"""
+    if isinstance(source, (list, tuple)):
+        return [path for item in source for path in list_source_files(item)]
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))
+        return [
+            os.path.join(source, name) for name in names
+            if name.lower().endswith(JSON_EXTENSIONS + JSONL_EXTENSIONS)
+        ]
+    if os.path.exists(source):
+        return [source]
+    raise FileNotFoundError(f"Data source not found: {source}")
+
+
+def iter_file_postings(path):
+    """Stream postings from one JSON or JSON Lines file"""
+    if path.lower().endswith(JSONL_EXTENSIONS):
+        return iter_jsonl_postings(path)
+    return iter_json_postings(path)
+
+
+def iter_postings(source):
+    """Stream postings from a file path or a directory of dumps"""
+    for path in list_source_files(source):
+        yield from iter_file_postings(path)
+
+
+def frame_from_postings(postings):
+    """Build a load postings DataFrame from any iterable of posting dicts"""
+    return ColumnBuffers().extend(postings).to_frame()
+
+
+def parse_workers():
+    return int(os.environ.get(PARSE_WORKERS_ENV) or os.cpu_count() or 1)
+
+
+def read_file_postings(path):
+    """Parse one feed file into a DataFrame (run in worker processes)"""
+    return frame_from_postings(iter_file_postings(path))
+
+
+def read_postings(source, workers=None):
+    """Read a file, JSON Lines file, directory of dumps or list of those into a DataFrame
+
+    With more than one file and worker, each file is parsed into its own
+    column chunk in a process pool and the chunks are concatenated once.
+    """
+    paths = list_source_files(source)
+    workers = min(parse_workers() if workers is None else workers, len(paths))
+    if workers <= 1:
+        return frame_from_postings(iter_postings(paths))
+
+    # Spawned, not forked: the Streamlit server is multi-threaded and a forked
+    # worker could inherit a lock another thread holds
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        frames = list(pool.map(read_file_postings, paths))
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    # A column that is all null in one file comes back as object; re-infer
+    # so the result has the dtypes a serial read would give
+    return pd.concat(frames, ignore_index=True).infer_objects()
+
+
+def resolve_source(source=None):
+    """Return the configured data source, falling back to the environment"""
+    if source:
+        return source
+    source = os.environ.get(DATA_SOURCE_ENV)
+    if source and os.pathsep in source:
+        return tuple(path for path in source.split(os.pathsep) if path)
+    return source or None
+
+
+def enrich_postings(df):
+    """Add the derived date, dollar and route columns used by the dashboard"""
+    # Convert timestamps to datetime
+    df['posted_date'] = pd.to_datetime(df['postedTimestamp'], unit='ms')
+    df['pickup_date'] = pd.to_datetime(df['pickupTimestamp'], unit='ms')
+    df['posted_date_only'] = df['posted_date'].dt.normalize()
+    df['pickup_date_only'] = df['pickup_date'].dt.normalize()
+
+    # Fill lane distances the feed left out from the coordinates
+    if 'distanceMiles' in df.columns:
+        missing = df['distanceMiles'].isna().to_numpy() | (df['distanceMiles'].fillna(0).to_numpy() <= 0)
+        if missing.any():
+            distance = df['distanceMiles'].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+            distance[missing] = np.rint(lane_miles(df[missing]))
+            df['distanceMiles'] = distance if np.isnan(distance).any() else distance.astype(np.int64)
+
+    # Convert rate from cents to dollars
+    df['rate_dollars'] = df['rateCents'] / 100
+    df['rate_per_mile_dollars'] = df['rateCentsPerMile'] / 100
+
+    before = int(df.memory_usage(deep=True).sum())
+    df = apply_dtype_schema(df)
+
+    # Create origin-destination lanes
+    df['route'] = build_routes(df)
+
+    df.attrs['memory_usage'] = {
+        'before': before,
+        'after': int(df.memory_usage(deep=True).sum()),
+    }
+    return df
+
+
+def apply_dtype_schema(df):
+    """Store low-cardinality strings as categoricals and downcast integer columns"""
+    for group in CATEGORY_GROUPS:
+        columns = [column for column in group if column in df.columns]
+        if not columns:
+            continue
+        categories = pd.Index(
+            pd.concat([df[column] for column in columns], ignore_index=True).dropna().unique()
+        ).sort_values()
+        dtype = pd.CategoricalDtype(categories)
+        for column in columns:
+            df[column] = df[column].astype(dtype)
+
+    for column in DOWNCAST_INTEGER_COLUMNS:
+        if column in df.columns and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+
+    for column in ('viewed', 'credit'):
+        if column in df.columns and df[column].notna().all():
+            df[column] = df[column].astype(bool)
+
+    return df
+
+
+def build_routes(df):
+    """Encode each origin/destination pair as an integer lane ID
+
+    Returns a categorical whose codes are the lane IDs and whose categories
+    are the lane labels, so label strings are built once per distinct lane
+    instead of once per row. Expects the shared city/state categoricals
+    from apply_dtype_schema().
+    """
+    cities = df['originCity'].cat.categories
+    states = df['originState'].cat.categories
+    n_cities, n_states = max(len(cities), 1), max(len(states), 1)
+
+    origin_city = df['originCity'].cat.codes.to_numpy(np.int64)
+    origin_state = df['originState'].cat.codes.to_numpy(np.int64)
+    destination_city = df['destinationCity'].cat.codes.to_numpy(np.int64)
+    destination_state = df['destinationState'].cat.codes.to_numpy(np.int64)
+
+    keys = ((origin_city * n_states + origin_state) * n_cities + destination_city) * n_states + destination_state
+    present = (origin_city >= 0) & (origin_state >= 0) & (destination_city >= 0) & (destination_state >= 0)
+
+    lane_ids = np.full(len(df), -1, dtype=np.int32)
+    present_ids, lane_keys = pd.factorize(keys[present], sort=True)
+    lane_ids[present] = present_ids
+
+    # Decode the distinct lane keys back into their four parts for the labels
+    lane_destination_state, rest = np.divmod(lane_keys, n_states)[::-1]
+    lane_destination_city, rest = np.divmod(rest, n_cities)[::-1]
+    lane_origin_state, lane_origin_city = np.divmod(rest, n_states)[::-1]
+    labels = (
+        cities.take(lane_origin_city).astype(str) + ', ' + states.take(lane_origin_state).astype(str)
+        + ' → ' + cities.take(lane_destination_city).astype(str) + ', ' + states.take(lane_destination_state).astype(str)
+    )
+    return pd.Categorical.from_codes(lane_ids, categories=labels)
+
+
+def concat_enriched(df, new):
+    """Append enriched rows to an enriched frame, growing the category dictionaries
+
+    Categories first seen in new are added after the existing ones, so the
+    codes already held by df (and any index built on them) stay valid.
+    """
+    new = new.copy(deep=False)
+    df = df.copy(deep=False)
+    for group in CATEGORY_GROUPS + [["route"]]:
+        columns = [column for column in group if column in df.columns]
+        if not columns:
+            continue
+        categories = df[columns[0]].cat.categories
+        unseen = pd.Index(
+            pd.concat([new[column].astype(object) for column in columns], ignore_index=True).dropna().unique()
+        ).difference(categories)
+        dtype = pd.CategoricalDtype(categories.append(unseen))
+        for column in columns:
+            if len(unseen):
+                df[column] = df[column].cat.add_categories(unseen)
+            new[column] = new[column].astype(object).astype(dtype)
+
+    combined = pd.concat([df, new], ignore_index=True)
+    # Measuring the combined frame deeply would cost a pass over every row
+    usage = [frame.attrs.get('memory_usage', {}) for frame in (df, new)]
+    combined.attrs['memory_usage'] = {
+        key: sum(item.get(key, 0) for item in usage) for key in ('before', 'after')
+    }
+    return combined
+
+
+def read_enriched_postings(source):
+    """Read a source and add the derived dashboard columns"""
+    return enrich_postings(read_postings(source))
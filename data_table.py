@@ -0,0 +1,106 @@
+"""
+Server-side search, sort and pagination for the dashboard's data table
+
+The table works on row positions into the loaded frame, or None for all
+rows in frame order: search and sort only reorder integer positions, and
+the column projection and renaming happen on the visible page alone, so
+the browser never receives more than one page of rows.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Columns shown in the table, with their display labels
+TABLE_COLUMNS = {
+    'referenceNumber': 'Reference #',
+    'route': 'Route',
+    'equipmentType': 'Equipment',
+    'rate_dollars': 'Rate ($)',
+    'distanceMiles': 'Distance (miles)',
+    'weight': 'Weight (lbs)',
+    'companyName': 'Company',
+    'posted_date': 'Posted Date',
+}
+
+# Text columns the search box looks in
+SEARCH_COLUMNS = ['referenceNumber', 'route', 'equipmentType', 'companyName']
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def row_count(df, rows):
+    """Number of rows selected, where None means every row of df"""
+    return len(df) if rows is None else len(rows)
+
+
+def search_rows(df, rows, query):
+    """Keep the rows where any search column contains query (case-insensitive)
+
+    rows=None stands for every row in frame order and is returned as is
+    when there is nothing to search for.
+    """
+    query = (query or '').strip()
+    if not query or row_count(df, rows) == 0:
+        return rows
+
+    found = np.zeros(row_count(df, rows), dtype=bool)
+    for column_name in SEARCH_COLUMNS:
+        column = df[column_name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Match against the category labels once, then test codes
+            hits = column.cat.categories.astype(str).str.contains(query, case=False, regex=False)
+            if hits.any():
+                codes = column.cat.codes.to_numpy()
+                codes = codes if rows is None else codes[rows]
+                found |= np.asarray(hits)[codes] & (codes >= 0)
+        else:
+            values = column if rows is None else column.take(rows)
+            found |= values.astype(str).str.contains(query, case=False, regex=False).to_numpy()
+    return np.flatnonzero(found) if rows is None else np.asarray(rows)[found]
+
+
+def _sort_keys(column, rows):
+    """Return float sort keys for the given rows with missing values as NaN"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Rank categories by label so codes sort alphabetically
+        ranks = np.empty(len(column.cat.categories), dtype=np.float64)
+        ranks[np.argsort(column.cat.categories.astype(str), kind='stable')] = np.arange(len(ranks))
+        codes = column.cat.codes.to_numpy()[rows]
+        return np.where(codes >= 0, ranks[codes], np.nan)
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.take(rows)
+        keys = values.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+        return np.where(values.isna().to_numpy(), np.nan, keys)
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+    codes, _ = pd.factorize(column.take(rows), sort=True)
+    return np.where(codes >= 0, codes, np.nan).astype(np.float64)
+
+
+def sort_rows(df, rows, column_name, ascending=True):
+    """Order row positions by a column, keeping missing values last
+
+    Without a column the rows are returned as given, None included.
+    """
+    if column_name is None or row_count(df, rows) == 0:
+        return rows
+    rows = np.arange(len(df)) if rows is None else np.asarray(rows)
+    keys = _sort_keys(df[column_name], rows)
+    if not ascending:
+        keys = -keys
+    # NaNs sort last either way, and a stable sort keeps ties in row order
+    return rows[np.argsort(keys, kind='stable')]
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def page_frame(df, rows, page, page_size):
+    """Project and rename just the rows on one 1-based page"""
+    start = (page - 1) * page_size
+    if rows is None:
+        page = df.iloc[start:start + page_size]
+    else:
+        page = df.take(np.asarray(rows)[start:start + page_size])
+    return page[list(TABLE_COLUMNS)].rename(columns=TABLE_COLUMNS)
@@ -0,0 +1,280 @@
+"""
+The dashboard's loaded postings, with incremental ingest of new ones
+
+A Dataset bundles the enriched frame with its filter indexes, aggregate
+engine and cube, and sorted posting ids, each built on first use.
+Appending builds a new Dataset from the old one, enriching and indexing
+only the postings whose ids have not been seen, so a refresh costs time
+in proportion to the new postings.
+DatasetStore holds the current Dataset for a source and swaps in the
+grown one, so sessions mid-run keep a consistent snapshot. Its watcher
+thread rescans the source in the background so sessions never wait on
+parsing.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from aggregates import AggregateCube, AggregateEngine
+from data_source import (
+    JSONL_EXTENSIONS, complete_line_offset, concat_enriched, enrich_postings, frame_from_postings, iter_json_postings,
+    list_source_files, read_jsonl_tail
+)
+from filter_index import FilterIndex
+from frame_cache import update_cached_frame
+from geo import extended_places, place_coordinates
+from matching import LoadMatcher
+
+# Seconds between background rescans of the data source; 0 turns the watcher off
+REFRESH_SECONDS_ENV = "DASHBOARD_REFRESH_SECONDS"
+DEFAULT_REFRESH_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_interval():
+    return float(os.environ.get(REFRESH_SECONDS_ENV) or DEFAULT_REFRESH_SECONDS)
+
+
+def scan_source(source):
+    """Stat a source's files before reading them: path -> (size, mtime_ns, bytes read by then)
+
+    JSON Lines offsets stop after the last complete line, so postings
+    written while the source is being read are picked up by the first
+    refresh (and deduplicated if the read already saw them).
+    """
+    files = {}
+    for path in list_source_files(source):
+        stat = os.stat(path)
+        offset = complete_line_offset(path, stat.st_size) if path.lower().endswith(JSONL_EXTENSIONS) else stat.st_size
+        files[path] = (stat.st_size, stat.st_mtime_ns, offset)
+    return files
+
+
+class Dataset:
+    """An enriched frame with the indexes and aggregates built over it"""
+
+    def __init__(self, df, filter_index=None, aggregate_engine=None, cube=None, ids=None, version=0):
+        self.df = df
+        # FilterIndex builds its own indexes on first use
+        self.filter_index = filter_index if filter_index is not None else FilterIndex(df)
+        # The rest are built on first use, or carried over from the dataset this one grew from
+        self._aggregate_engine = aggregate_engine
+        self._cube = cube
+        self._ids = ids
+        self.version = version
+        self._places = None
+        self._matcher = None
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def aggregate_engine(self):
+        if self._aggregate_engine is None:
+            self._aggregate_engine = AggregateEngine(self.df)
+        return self._aggregate_engine
+
+    @property
+    def cube(self):
+        if self._cube is None:
+            self._cube = AggregateCube(self.aggregate_engine, self.df)
+        return self._cube
+
+    @property
+    def ids(self):
+        """Sorted posting ids, for deduplicating appended postings"""
+        if self._ids is None:
+            self._ids = np.unique(self.df['id'].to_numpy())
+        return self._ids
+
+    def places(self):
+        """Coordinates of the feed's cities for radius searches, computed on first use"""
+        if self._places is None:
+            self._places = place_coordinates(self.df)
+        return self._places
+
+    def matcher(self):
+        """Truck-to-load matcher over this dataset, created on first use"""
+        if self._matcher is None:
+            self._matcher = LoadMatcher(self.df, self.filter_index)
+        return self._matcher
+
+    def unseen(self, ids):
+        """Return a mask of ids that are neither in the dataset nor earlier in ids"""
+        ids = np.asarray(ids)
+        found = np.searchsorted(self.ids, ids)
+        seen = found < len(self.ids)
+        seen[seen] = self.ids[found[seen]] == ids[seen]
+        first = np.zeros(len(ids), dtype=bool)
+        first[np.unique(ids, return_index=True)[1]] = True
+        return ~seen & first
+
+    def append(self, postings):
+        """Return (dataset, added): the dataset grown by postings with unseen ids"""
+        new = frame_from_postings(postings)
+        if new.empty:
+            return self, 0
+        new = new[self.unseen(new['id'].to_numpy())].reset_index(drop=True)
+        if new.empty:
+            return self, 0
+
+        new = enrich_postings(new)
+        df = concat_enriched(self.df, new)
+        ids = np.sort(new['id'].to_numpy())
+        # Only what was already built is extended; the rest is built from df when needed
+        aggregate_engine = None if self._aggregate_engine is None else self._aggregate_engine.extended(df)
+        # Building the cube builds the engine first, so a built cube always has one
+        cube = None if self._cube is None else self._cube.extended(aggregate_engine, df)
+        dataset = Dataset(
+            df,
+            filter_index=self.filter_index.extended(df),
+            aggregate_engine=aggregate_engine,
+            cube=cube,
+            ids=np.insert(self.ids, np.searchsorted(self.ids, ids), ids),
+            version=self.version + 1,
+        )
+        # Sessions read places every rerun and trucks reuse the match partitions,
+        # so both are grown here, off the request path when the watcher appends
+        if self._places is not None:
+            dataset._places = extended_places(self._places, new)
+        if self._matcher is not None:
+            dataset._matcher = self._matcher.extended(df, dataset.filter_index)
+        return dataset, len(new)
+
+
+class DatasetStore:
+    """The current Dataset for a source, grown in place as new postings arrive"""
+
+    def __init__(self, dataset, source=None, cache_frames=False, files=None):
+        self._dataset = dataset
+        self.source = source
+        # Write grown frames back to the frame cache, so a restart skips parsing them
+        self.cache_frames = cache_frames
+        self.last_added = 0
+        self.last_error = None
+        # When the source was last scanned, and when that last added postings
+        self.checked_at = self.updated_at = datetime.now()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._watcher = None
+        # path -> (size, mtime_ns, bytes of JSON Lines already read); pass the
+        # scan_source() taken before the dataset was read, or the files are
+        # scanned now and anything written since the read is skipped
+        if files is None:
+            files = scan_source(source) if source else {}
+        self.files = dict(files)
+
+    def current(self):
+        """Return the current Dataset; it never changes once returned"""
+        return self._dataset
+
+    def ingest(self, postings):
+        """Append postings with unseen ids and return how many were added"""
+        with self._lock:
+            self._dataset, added = self._dataset.append(postings)
+            self.last_added = added
+            if added:
+                self.updated_at = datetime.now()
+            return added
+
+    def _scan_files(self):
+        files = {}
+        for path in list_source_files(self.source):
+            stat = os.stat(path)
+            files[path] = (stat.st_size, stat.st_mtime_ns, 0)
+        return files
+
+    def refresh(self):
+        """Ingest postings from source files that are new or changed since the last scan
+
+        JSON Lines files that only grew are read from where the last scan
+        stopped; other new or changed files are re-read and deduplicated on id.
+        """
+        if not self.source:
+            return 0
+        with self._lock:
+            postings = []
+            files = self._scan_files()
+            for path, (size, mtime_ns, _) in files.items():
+                known = self.files.get(path)
+                if known is not None and known[:2] == (size, mtime_ns):
+                    files[path] = known
+                    continue
+                if path.lower().endswith(JSONL_EXTENSIONS):
+                    offset = known[2] if known is not None and size >= known[2] else 0
+                    tail, offset = read_jsonl_tail(path, offset)
+                    postings.extend(tail)
+                    files[path] = (size, mtime_ns, offset)
+                else:
+                    postings.extend(iter_json_postings(path))
+                    files[path] = (size, mtime_ns, size)
+            self.files = files
+            self._dataset, added = self._dataset.append(postings)
+            dataset = self._dataset
+            self.last_added = added
+            self.checked_at = datetime.now()
+            if added:
+                self.updated_at = self.checked_at
+        if added and self.cache_frames:
+            self._cache_frame(dataset, files)
+        return added
+
+    def _cache_frame(self, dataset, files):
+        """Store the dataset's frame under the fingerprint of the files it was read from"""
+        # A file that changed since the scan would be keyed by rows it does not hold
+        scanned = {path: stat[:2] for path, stat in files.items()}
+        if {path: stat[:2] for path, stat in self._scan_files().items()} == scanned:
+            update_cached_frame(self.source, dataset.df)
+
+    @property
+    def watching(self):
+        return self._watcher is not None and self._watcher.is_alive()
+
+    def start_watcher(self, interval=None):
+        """Rescan the source every interval seconds on a daemon thread
+
+        Does nothing without a file source, with a non-positive interval or
+        when the watcher is already running.
+        """
+        interval = refresh_interval() if interval is None else interval
+        if not self.source or interval <= 0 or self.watching:
+            return False
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="dataset-watcher", daemon=True
+        )
+        self._watcher.start()
+        return True
+
+    def stop_watcher(self):
+        self._stop.set()
+        self._wake.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def wake(self):
+        """Ask the watcher to rescan now instead of at its next interval"""
+        self._wake.set()
+
+    def _watch(self, interval):
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                added = self.refresh()
+                self.last_error = None
+                if added:
+                    logger.info("Ingested %d new postings from %s", added, self.source)
+            except Exception as e:
+                # Keep serving the current dataset; a partial file is retried next scan
+                self.last_error = e
+                logger.warning("Refreshing %s failed: %s", self.source, e)
@@ -0,0 +1,263 @@
+"""
+Precomputed row indexes for the dashboard's sidebar filters
+
+Each categorical filter column gets an inverted index (value -> sorted row
+positions) and the rate, posted time and pickup time columns a sorted
+order, each built the first time a filter needs it. Range filters
+binary-search their sorted order for the matching slice of rows, and
+radius filters check only the rows in nearby cells of a grid index over
+the coordinates. A selection starts from the smallest candidate row set
+and checks the remaining filters only on those rows, so a widget change
+costs time proportional to the selected rows rather than the whole frame.
+"""
+
+import copy
+
+import numpy as np
+
+from geo import GridIndex
+
+
+def _position_dtype(size):
+    return np.int32 if size < np.iinfo(np.int32).max else np.int64
+
+
+class InvertedIndex:
+    """Sorted row positions for every category of a categorical column"""
+
+    def __init__(self, column):
+        self.categories = column.cat.categories
+        self.codes = column.cat.codes.to_numpy()
+        # A stable sort keeps row positions ascending within each value
+        self.order = np.argsort(self.codes, kind='stable').astype(_position_dtype(len(column)))
+        self.bounds = np.searchsorted(self.codes[self.order], np.arange(len(self.categories) + 1))
+
+    def extended(self, column):
+        """Return an index over column, which is this index's column with rows appended
+
+        The appended rows are inserted into the existing order instead of
+        re-sorting every row.
+        """
+        index = copy.copy(self)
+        old_size = len(self.codes)
+        index.categories = column.cat.categories
+        index.codes = column.cat.codes.to_numpy()
+        new_codes = index.codes[old_size:]
+        by_code = np.argsort(new_codes, kind='stable')
+        new_codes = new_codes[by_code]
+
+        # Missing values (code -1) end just before code 0; new categories go last
+        ends = np.concatenate([self.bounds, np.full(len(index.categories) - len(self.categories), len(self.order))])
+        insert_at = np.where(new_codes < 0, ends[0], ends[new_codes + 1])
+        rows = (by_code + old_size).astype(_position_dtype(len(column)))
+        index.order = np.insert(self.order.astype(rows.dtype), insert_at, rows)
+        index.bounds = np.searchsorted(index.codes[index.order], np.arange(len(index.categories) + 1))
+        return index
+
+    def code(self, value):
+        """Return the category code for a value, or -1 if it never occurs"""
+        try:
+            return self.categories.get_loc(value)
+        except KeyError:
+            return -1
+
+    def rows(self, code):
+        if code < 0:
+            return self.order[:0]
+        return self.order[self.bounds[code]:self.bounds[code + 1]]
+
+    def matches(self, rows, code):
+        """Return a mask of which rows hold the given code"""
+        if code < 0:
+            return np.zeros(len(rows), dtype=bool)
+        return self.codes[rows] == code
+
+    def count(self, code):
+        if code < 0:
+            return 0
+        return int(self.bounds[code + 1] - self.bounds[code])
+
+
+class SortedIndex:
+    """Row positions ordered by a numeric column, for range lookups"""
+
+    def __init__(self, column):
+        self.values = column.to_numpy(dtype=np.float64)
+        # NaNs sort last and are never inside a range
+        self.order = np.argsort(self.values, kind='stable').astype(_position_dtype(len(column)))
+        self.sorted_values = self.values[self.order]
+        self.present = int(np.count_nonzero(~np.isnan(self.sorted_values)))
+
+    def extended(self, column):
+        """Return an index over column, which is this index's column with rows appended"""
+        index = copy.copy(self)
+        old_size = len(self.values)
+        new_values = column.to_numpy(dtype=np.float64)[old_size:]
+        by_value = np.argsort(new_values, kind='stable')
+        # Ties go after existing rows, keeping equal values in row order
+        insert_at = np.searchsorted(self.sorted_values, new_values[by_value], side='right')
+        rows = (by_value + old_size).astype(_position_dtype(len(column)))
+        index.values = np.concatenate([self.values, new_values])
+        index.order = np.insert(self.order.astype(rows.dtype), insert_at, rows)
+        index.sorted_values = np.insert(self.sorted_values, insert_at, new_values[by_value])
+        index.present = self.present + int(np.count_nonzero(~np.isnan(new_values)))
+        return index
+
+    def bounds(self, low, high):
+        """Return the [start, stop) slice of sorted rows with low <= value <= high"""
+        start = np.searchsorted(self.sorted_values, low, side='left')
+        stop = np.searchsorted(self.sorted_values, high, side='right')
+        return int(start), int(stop)
+
+    def value_range(self):
+        """Return the (min, max) of the non-missing values"""
+        if self.present == 0:
+            return 0.0, 0.0
+        return float(self.sorted_values[0]), float(self.sorted_values[self.present - 1])
+
+    def rows(self, low, high):
+        start, stop = self.bounds(low, high)
+        return np.sort(self.order[start:stop])
+
+
+def _range_predicate(index, size, value_range):
+    """Return a (count, rows, matches) predicate for a range filter, or None if it keeps every row"""
+    if value_range is None:
+        return None
+    low, high = value_range
+    start, stop = index.bounds(low, high)
+    if stop - start == size:
+        return None
+    return (
+        stop - start,
+        lambda: index.rows(low, high),
+        lambda rows: (index.values[rows] >= low) & (index.values[rows] <= high),
+    )
+
+
+def _radius_predicate(index, radius):
+    """Return a (count, rows, matches) predicate for a (lat, lon, miles) radius filter, or None"""
+    if radius is None:
+        return None
+    lat, lon, miles = radius
+    return (
+        index.candidate_count(lat, lon, miles),
+        lambda: index.rows(lat, lon, miles),
+        lambda rows: index.matches(rows, lat, lon, miles),
+    )
+
+
+# FilterIndex attribute -> index type and the columns it is built from.
+# Timestamps are epoch milliseconds; float64 holds them exactly.
+INDEXES = {
+    'equipment': (InvertedIndex, ('equipmentType',)),
+    'company': (InvertedIndex, ('companyName',)),
+    'origin_state': (InvertedIndex, ('originState',)),
+    'destination_state': (InvertedIndex, ('destinationState',)),
+    'rate': (SortedIndex, ('rate_dollars',)),
+    'posted': (SortedIndex, ('postedTimestamp',)),
+    'pickup': (SortedIndex, ('pickupTimestamp',)),
+    'origin': (GridIndex, ('originLatitude', 'originLongitude')),
+    'destination': (GridIndex, ('destinationLatitude', 'destinationLongitude')),
+}
+
+
+class FilterIndex:
+    """Indexes over equipment, state, company, rate, times and locations for fast sidebar filtering
+
+    Each index in INDEXES is built on first access, so a start from the
+    frame cache only sorts the columns the first page reads.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.size = len(df)
+
+    def __getattr__(self, name):
+        # Only reached for indexes that have not been built yet
+        if name not in INDEXES:
+            raise AttributeError(name)
+        index_type, columns = INDEXES[name]
+        index = index_type(*(self.df[column] for column in columns))
+        setattr(self, name, index)
+        return index
+
+    def extended(self, df):
+        """Return indexes for df, which is this index's frame with rows appended
+
+        Indexes that were built are extended; the rest stay unbuilt.
+        """
+        index = copy.copy(self)
+        index.df = df
+        index.size = len(df)
+        for name, (_, columns) in INDEXES.items():
+            if name in self.__dict__:
+                setattr(index, name, self.__dict__[name].extended(*(df[column] for column in columns)))
+        return index
+
+    def _state_rows(self, state):
+        origin = self.origin_state.rows(self.origin_state.code(state))
+        destination = self.destination_state.rows(self.destination_state.code(state))
+        return np.union1d(origin, destination)
+
+    def select(self, equipment=None, state=None, company=None, rate_range=None,
+               posted_range=None, pickup_range=None, origin_radius=None, destination_radius=None):
+        """Return sorted row positions matching the selection
+
+        Filters left as None (or 'All') are ignored. posted_range and
+        pickup_range are inclusive (start, end) epoch milliseconds;
+        origin_radius and destination_radius are (lat, lon, miles). Returns
+        None when no filter restricts the rows, so callers can use the
+        frame as-is.
+        """
+        predicates = []
+
+        if equipment not in (None, 'All'):
+            equipment_code = self.equipment.code(equipment)
+            predicates.append((
+                self.equipment.count(equipment_code),
+                lambda: self.equipment.rows(equipment_code),
+                lambda rows: self.equipment.matches(rows, equipment_code),
+            ))
+
+        if state not in (None, 'All'):
+            origin_code = self.origin_state.code(state)
+            destination_code = self.destination_state.code(state)
+            predicates.append((
+                self.origin_state.count(origin_code) + self.destination_state.count(destination_code),
+                lambda: self._state_rows(state),
+                lambda rows: (
+                    self.origin_state.matches(rows, origin_code)
+                    | self.destination_state.matches(rows, destination_code)
+                ),
+            ))
+
+        if company not in (None, 'All'):
+            company_code = self.company.code(company)
+            predicates.append((
+                self.company.count(company_code),
+                lambda: self.company.rows(company_code),
+                lambda rows: self.company.matches(rows, company_code),
+            ))
+
+        for index, value_range in [(self.rate, rate_range), (self.posted, posted_range), (self.pickup, pickup_range)]:
+            predicate = _range_predicate(index, self.size, value_range)
+            if predicate is not None:
+                predicates.append(predicate)
+
+        for index, radius in [(self.origin, origin_radius), (self.destination, destination_radius)]:
+            predicate = _radius_predicate(index, radius)
+            if predicate is not None:
+                predicates.append(predicate)
+
+        if not predicates:
+            return None
+
+        # Start from the most selective filter and check the others on its rows
+        predicates.sort(key=lambda predicate: predicate[0])
+        rows = predicates[0][1]()
+        for _, _, matches in predicates[1:]:
+            if len(rows) == 0:
+                break
+            rows = rows[matches(rows)]
+        return rows
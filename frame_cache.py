@@ -0,0 +1,127 @@
+"""
+On-disk cache of the processed load postings frame
+
+The enriched DataFrame is written as an uncompressed Arrow IPC file keyed
+by the source files' path, size and modification time, and memory-mapped
+on the next start so a restarted worker skips parsing and enrichment.
+"""
+
+import hashlib
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pa = None
+    ipc = None
+
+from data_source import list_source_files
+
+# Environment variable overriding where cache files are written
+CACHE_DIR_ENV = "DASHBOARD_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# Bump whenever enrich_postings() changes the stored columns
+CACHE_VERSION = 4
+
+
+def cache_enabled():
+    return pa is not None
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+
+
+def source_fingerprint(source):
+    """Hash the path, size and mtime of every file behind a source"""
+    digest = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for path in list_source_files(source):
+        stat = os.stat(path)
+        digest.update(f"\0{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _source_prefix(source):
+    paths = source if isinstance(source, (list, tuple)) else [source]
+    name = hashlib.sha1("\0".join(os.path.abspath(path) for path in paths).encode()).hexdigest()[:12]
+    return f"postings-{name}-"
+
+
+def cache_path(source):
+    return os.path.join(cache_dir(), f"{_source_prefix(source)}{source_fingerprint(source)}.arrow")
+
+
+def _remove_stale(source, keep):
+    """Delete cache files left behind by earlier versions of a source"""
+    prefix = _source_prefix(source)
+    for name in os.listdir(cache_dir()):
+        path = os.path.join(cache_dir(), name)
+        if name.startswith(prefix) and name.endswith(".arrow") and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_cached_frame(source, path=None):
+    """Memory-map the cached frame for a source, or return None on a miss"""
+    if not cache_enabled():
+        return None
+    path = cache_path(source) if path is None else path
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source_file:
+            table = ipc.open_file(source_file).read_all()
+        # split_blocks keeps numeric columns as zero-copy views of the map
+        return table.to_pandas(split_blocks=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def write_cached_frame(source, df, path=None):
+    """Store a processed frame for a source, replacing the file atomically
+
+    path defaults to the cache path for the files as they are now; pass the
+    one taken before reading them if they may have changed since.
+    """
+    if not cache_enabled():
+        return None
+    path = cache_path(source) if path is None else path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    _remove_stale(source, path)
+    return path
+
+
+def update_cached_frame(source, df, path=None):
+    """Write the cached frame for a source, returning None if it could not be stored"""
+    if not cache_enabled():
+        return None
+    try:
+        return write_cached_frame(source, df, path)
+    except (OSError, pa.ArrowException):
+        # A read-only or full disk only costs the next cold start
+        return None
+
+
+def load_or_build(source, build):
+    """Return the cached frame for a source, building and caching it on a miss"""
+    if not cache_enabled():
+        return build(source)
+    # Keyed by the files before the build, so rows appended while it runs
+    # make the next start miss instead of reloading a frame without them
+    path = cache_path(source)
+    df = read_cached_frame(source, path)
+    if df is not None:
+        return df
+    df = build(source)
+    update_cached_frame(source, df, path)
+    return df
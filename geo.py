@@ -0,0 +1,222 @@
+"""
+Great-circle distances, deadhead and a grid index for radius searches
+
+Distances are computed for whole arrays at once. Road miles are
+great-circle miles times a circuity factor. Deadhead from a batch of
+truck locations finds each load's nearest truck with matrix products of
+unit vectors, a chunk of loads at a time, so the load x truck matrix
+never exceeds a fixed number of elements.
+
+GridIndex buckets coordinates into uniform latitude/longitude cells and
+keeps the row positions sorted by cell. A "within N miles of a point"
+query binary-searches the cells overlapping the circle's bounding box,
+one contiguous run of cells per latitude band, and measures exact
+haversine distances only for the rows in those cells.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Miles per degree of latitude, and of longitude at the equator
+MILES_PER_DEGREE = EARTH_RADIUS_MILES * np.pi / 180
+
+# Road distance runs this much longer than great-circle distance
+ROAD_CIRCUITY = 1.18
+
+# Load x truck products held in memory at once when finding nearest trucks
+DISTANCE_CHUNK_ELEMENTS = 4_000_000
+
+# Grid cell size in degrees of latitude/longitude
+GRID_CELL_DEGREES = 1.0
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles between coordinate arrays (broadcasting)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def road_miles(lat1, lon1, lat2, lon2):
+    """Estimated road miles between coordinate arrays"""
+    return haversine_miles(lat1, lon1, lat2, lon2) * ROAD_CIRCUITY
+
+
+def lane_miles(df):
+    """Estimated road miles from each row's origin to its destination"""
+    return road_miles(df['originLatitude'], df['originLongitude'], df['destinationLatitude'], df['destinationLongitude'])
+
+
+def unit_vectors(lats, lons):
+    """Points on the unit sphere for coordinate arrays, shaped (n, 3)"""
+    lats, lons = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lons, dtype=np.float64))
+    return np.column_stack([np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)])
+
+
+def nearest_miles(from_lats, from_lons, to_lats, to_lons, chunk_elements=DISTANCE_CHUNK_ELEMENTS):
+    """Return (miles, nearest): for each target, the great-circle miles to its nearest point and that point
+
+    The nearest point has the largest dot product of unit vectors, so each
+    chunk of targets is one matrix product; haversine distances are then
+    measured for the chosen pairs only. Targets without coordinates, or
+    with no points to measure from, get NaN miles and -1.
+    """
+    from_lats, from_lons, to_lats, to_lons = (
+        np.asarray(value, dtype=np.float64) for value in (from_lats, from_lons, to_lats, to_lons)
+    )
+    points = np.flatnonzero(~np.isnan(from_lats) & ~np.isnan(from_lons))
+    from_vectors = unit_vectors(from_lats[points], from_lons[points])
+    to_vectors = unit_vectors(to_lats, to_lons)
+    nearest = np.full(len(to_vectors), -1, dtype=np.int64)
+    if len(points):
+        step = max(1, chunk_elements // len(points))
+        for start in range(0, len(to_vectors), step):
+            dots = to_vectors[start:start + step] @ from_vectors.T
+            nearest[start:start + step] = points[np.argmax(dots, axis=1)]
+    nearest[np.isnan(to_vectors).any(axis=1)] = -1
+
+    miles = np.full(len(to_vectors), np.nan)
+    found = nearest >= 0
+    miles[found] = haversine_miles(from_lats[nearest[found]], from_lons[nearest[found]], to_lats[found], to_lons[found])
+    return miles, nearest
+
+
+def deadhead_miles(df, truck_lats, truck_lons, end=None, chunk_elements=DISTANCE_CHUNK_ELEMENTS):
+    """Return (origin_deadhead, destination_deadhead, truck) road miles for every row
+
+    Origin deadhead runs from the nearest of the trucks to the pickup;
+    destination deadhead from the drop-off to end, a (lat, lon) where the
+    truck wants to finish, or zero without one.
+    """
+    miles, truck = nearest_miles(
+        truck_lats, truck_lons, df['originLatitude'], df['originLongitude'], chunk_elements
+    )
+    if end is None:
+        destination = np.zeros(len(df))
+    else:
+        destination = road_miles(df['destinationLatitude'], df['destinationLongitude'], end[0], end[1])
+    return miles * ROAD_CIRCUITY, destination, truck
+
+
+def place_coordinates(df):
+    """Return a 'City, ST' -> (lat, lon) frame of the places in the feed, sorted by name"""
+    frames = []
+    for prefix in ('origin', 'destination'):
+        places = df[[f'{prefix}City', f'{prefix}State', f'{prefix}Latitude', f'{prefix}Longitude']]
+        places.columns = ['city', 'state', 'lat', 'lon']
+        frames.append(places.dropna())
+    places = pd.concat(frames, ignore_index=True)
+    if places.empty:
+        return pd.DataFrame(columns=['lat', 'lon'], dtype=np.float64)
+    places = places.groupby(['city', 'state'], observed=True)[['lat', 'lon']].median()
+    places.index = [f"{city}, {state}" for city, state in places.index]
+    return places.sort_index()
+
+
+def extended_places(places, df):
+    """Return place_coordinates() output with the places first seen in df's rows added
+
+    Places already known keep their coordinates, so appended rows only
+    cost a pass over themselves.
+    """
+    added = place_coordinates(df)
+    added = added[~added.index.isin(places.index)]
+    if added.empty:
+        return places
+    return pd.concat([places, added]).sort_index()
+
+
+def expand_ranges(starts, stops):
+    """Concatenate arange(start, stop) for every pair, without a Python loop"""
+    lengths = np.maximum(np.asarray(stops) - np.asarray(starts), 0)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Each range's offset from its own start, plus that start
+    ends = np.cumsum(lengths)
+    return np.repeat(np.asarray(starts, dtype=np.int64) - (ends - lengths), lengths) + np.arange(total)
+
+
+class GridIndex:
+    """Row positions bucketed by latitude/longitude grid cell"""
+
+    def __init__(self, latitudes, longitudes, cell_degrees=GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.lat_cells = int(np.ceil(180 / cell_degrees))
+        self.lon_cells = int(np.ceil(360 / cell_degrees))
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        cells = self.cell_ids(self.latitudes, self.longitudes)
+        # A stable sort keeps row positions ascending within each cell
+        self.order = np.argsort(cells, kind='stable').astype(np.int32 if len(cells) < np.iinfo(np.int32).max else np.int64)
+        self.sorted_cells = cells[self.order]
+
+    def cell_ids(self, latitudes, longitudes):
+        """Grid cell id per coordinate, with -1 for missing coordinates"""
+        row = np.clip(np.floor((latitudes + 90) / self.cell_degrees), 0, self.lat_cells - 1)
+        column = np.floor(((longitudes + 180) % 360) / self.cell_degrees) % self.lon_cells
+        cells = row * self.lon_cells + column
+        return np.where(np.isnan(cells), -1, cells).astype(np.int64)
+
+    def extended(self, latitudes, longitudes):
+        """Return an index over the coordinates, which are this index's with rows appended"""
+        index = copy.copy(self)
+        old_size = len(self.latitudes)
+        index.latitudes = np.asarray(latitudes, dtype=np.float64)
+        index.longitudes = np.asarray(longitudes, dtype=np.float64)
+        new_cells = self.cell_ids(index.latitudes[old_size:], index.longitudes[old_size:])
+        by_cell = np.argsort(new_cells, kind='stable')
+        insert_at = np.searchsorted(self.sorted_cells, new_cells[by_cell], side='right')
+        rows = (by_cell + old_size).astype(np.int32 if len(index.latitudes) < np.iinfo(np.int32).max else np.int64)
+        index.order = np.insert(self.order.astype(rows.dtype), insert_at, rows)
+        index.sorted_cells = np.insert(self.sorted_cells, insert_at, new_cells[by_cell])
+        return index
+
+    def cell_ranges(self, lat, lon, miles):
+        """Return (starts, stops): runs of cell ids covering the circle's bounding box"""
+        lat_margin = miles / MILES_PER_DEGREE
+        low_row = int(np.clip(np.floor((lat - lat_margin + 90) / self.cell_degrees), 0, self.lat_cells - 1))
+        high_row = int(np.clip(np.floor((lat + lat_margin + 90) / self.cell_degrees), 0, self.lat_cells - 1))
+
+        # Longitude degrees shrink toward the poles; use the widest latitude in the box
+        widest = min(abs(lat) + lat_margin, 90.0)
+        cos_lat = np.cos(np.radians(widest))
+        lon_margin = 180.0 if cos_lat * 180 * MILES_PER_DEGREE <= miles else miles / (MILES_PER_DEGREE * cos_lat)
+        if lon_margin >= 180.0:
+            column_runs = [(0, self.lon_cells - 1)]
+        else:
+            first = int(np.floor(((lon - lon_margin + 180) % 360) / self.cell_degrees)) % self.lon_cells
+            last = int(np.floor(((lon + lon_margin + 180) % 360) / self.cell_degrees)) % self.lon_cells
+            # A box across the antimeridian wraps into two runs of columns
+            column_runs = [(first, last)] if first <= last else [(first, self.lon_cells - 1), (0, last)]
+
+        rows = np.arange(low_row, high_row + 1) * self.lon_cells
+        starts = np.concatenate([rows + first for first, _ in column_runs])
+        stops = np.concatenate([rows + last + 1 for _, last in column_runs])
+        return starts, stops
+
+    def _slices(self, lat, lon, miles):
+        """Return (starts, stops) into the sorted order covering the circle's bounding box"""
+        starts, stops = self.cell_ranges(lat, lon, miles)
+        return np.searchsorted(self.sorted_cells, starts), np.searchsorted(self.sorted_cells, stops)
+
+    def candidate_count(self, lat, lon, miles):
+        """Rows in the cells a radius query would check"""
+        starts, stops = self._slices(lat, lon, miles)
+        return int((stops - starts).sum())
+
+    def distances(self, rows, lat, lon):
+        return haversine_miles(self.latitudes[rows], self.longitudes[rows], lat, lon)
+
+    def matches(self, rows, lat, lon, miles):
+        """Return a mask of which rows lie within miles of (lat, lon)"""
+        return self.distances(rows, lat, lon) <= miles
+
+    def rows(self, lat, lon, miles):
+        """Return sorted row positions within miles of (lat, lon)"""
+        candidates = self.order[expand_ranges(*self._slices(lat, lon, miles))]
+        return np.sort(candidates[self.matches(candidates, lat, lon, miles)])
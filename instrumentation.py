@@ -0,0 +1,156 @@
+"""
+Opt-in timing of the dashboard's sections
+
+A RunTimer is created at the start of every rerun. When profiling is on
+(DASHBOARD_PROFILE=1 or ?profile=1 in the URL) it records how long each
+named section took and how many bytes each chart or table sent to the
+browser, shows them in a debug panel and, with DASHBOARD_PROFILE_LOG=1,
+logs them to stderr as one JSON record per rerun. When off, sections
+cost a context manager call and nothing is measured.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pa = None
+
+PROFILE_ENV = "DASHBOARD_PROFILE"
+PROFILE_LOG_ENV = "DASHBOARD_PROFILE_LOG"
+PROFILE_QUERY_PARAM = "profile"
+
+logger = logging.getLogger("dashboard.timing")
+
+# Added to logger the first time a run is logged
+_log_handler = None
+
+
+def _flag(value):
+    return str(value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _enable_log_output():
+    """Send run records to stderr at INFO, keeping any level set elsewhere"""
+    global _log_handler
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    if _log_handler is None:
+        _log_handler = logging.StreamHandler()
+        _log_handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(_log_handler)
+
+
+def profiling_enabled(query_params=None):
+    """Return whether this run should be timed, from the environment or the URL"""
+    if _flag(os.environ.get(PROFILE_ENV)):
+        return True
+    return query_params is not None and _flag(query_params.get(PROFILE_QUERY_PARAM))
+
+
+def figure_bytes(fig):
+    """Size of the JSON spec Streamlit sends for a Plotly figure"""
+    return len(fig.to_json())
+
+
+def frame_bytes(df):
+    """Size of a DataFrame as Streamlit sends it (Arrow IPC), or its memory as a fallback"""
+    if pa is None:
+        return int(df.memory_usage(deep=True).sum())
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+class RunTimer:
+    """Section timings and payload sizes for one rerun of the script"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def section(self, name):
+        """Time the enclosed block as a named section"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append({
+                'section': name,
+                'start_ms': (start - self.started) * 1000,
+                'ms': (time.perf_counter() - start) * 1000,
+                'bytes': None,
+            })
+
+    def _add_bytes(self, nbytes):
+        self.records[-1]['bytes'] = nbytes
+
+    def plotly_chart(self, name, fig, **kwargs):
+        """st.plotly_chart, timed and with its payload size recorded"""
+        with self.section(f"render/{name}"):
+            st.plotly_chart(fig, **kwargs)
+        if self.enabled:
+            self._add_bytes(figure_bytes(fig))
+
+    def dataframe(self, name, data, **kwargs):
+        """st.dataframe, timed and with its payload size recorded"""
+        with self.section(f"render/{name}"):
+            st.dataframe(data, **kwargs)
+        if self.enabled:
+            self._add_bytes(frame_bytes(data))
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def frame(self):
+        """Return the recorded sections in start order"""
+        df = pd.DataFrame(self.records, columns=['section', 'start_ms', 'ms', 'bytes'])
+        return df.sort_values('start_ms', kind='stable', ignore_index=True)
+
+    def log(self, **context):
+        """Log this run's sections as one structured JSON record"""
+        if not self.enabled or not _flag(os.environ.get(PROFILE_LOG_ENV)):
+            return
+        _enable_log_output()
+        logger.info(json.dumps({
+            'event': 'dashboard_run',
+            'total_ms': round(self.total_ms(), 3),
+            'sections': [
+                {key: round(value, 3) if isinstance(value, float) else value for key, value in record.items()}
+                for record in self.records
+            ],
+            **context,
+        }, default=str))
+
+    def render_panel(self):
+        """Show the timings in a collapsed expander at the bottom of the page"""
+        if not self.enabled:
+            return
+        total = self.total_ms()
+        with st.expander(f"⏱️ Timing ({total:,.0f} ms)", expanded=False):
+            timings = self.frame()
+            timings['share'] = timings['ms'] / total if total else 0.0
+            st.dataframe(
+                timings.rename(columns={
+                    'section': 'Section', 'start_ms': 'Start (ms)', 'ms': 'Time (ms)',
+                    'bytes': 'Payload (bytes)', 'share': 'Share of run',
+                }).round(2),
+                use_container_width=True,
+                hide_index=True,
+            )
+            sent = timings['bytes'].dropna().sum()
+            st.caption(f"{len(timings)} sections, {sent / 1e6:,.2f} MB sent to the browser")
@@ -0,0 +1,190 @@
+"""
+Truck-to-load matching
+
+Ranks the loaded postings for one truck, or every truck in a fleet, by
+revenue per total mile: the rate over loaded plus deadhead miles.
+
+Loads are split into one partition per equipment type (from the
+equipment inverted index), and each partition is sorted by origin grid
+cell and then pickup time. A truck's candidates are, for every cell
+within its maximum deadhead, the binary-searched tail of loads picked up
+after it is available, so a query reads only loads of its equipment,
+near it and not already gone. Loads the truck cannot reach by their
+pickup time at DEADHEAD_MPH are dropped before ranking, and loads with
+no pickup time are never matched.
+"""
+
+import numpy as np
+import pandas as pd
+
+from geo import ROAD_CIRCUITY, expand_ranges, haversine_miles
+
+DEFAULT_MAX_DEADHEAD = 150
+DEFAULT_TOP_K = 10
+
+# Average empty driving speed, for whether a truck makes the pickup
+DEADHEAD_MPH = 50
+
+HOUR_MS = 3_600_000
+
+# Load columns copied into match results
+MATCH_COLUMNS = [
+    'referenceNumber', 'route', 'equipmentType', 'companyName', 'pickup_date', 'rate_dollars', 'distanceMiles',
+]
+
+# Fleet columns besides lat and lon, with the values used when they are missing
+TRUCK_DEFAULTS = {'equipment': None, 'available_at': None, 'max_deadhead': DEFAULT_MAX_DEADHEAD}
+
+
+def read_fleet(source):
+    """Read a fleet CSV into the columns match_fleet takes
+
+    Needs lat and lon; truck_id, equipment, available_at (epoch ms or a
+    date/time string, read as UTC) and max_deadhead are optional.
+    """
+    trucks = pd.read_csv(source)
+    trucks.columns = [column.strip() for column in trucks.columns]
+    missing = [column for column in ('lat', 'lon') if column not in trucks]
+    if missing:
+        raise ValueError(f"Fleet file is missing column(s): {', '.join(missing)}")
+    if 'available_at' in trucks and not pd.api.types.is_numeric_dtype(trucks['available_at']):
+        times = pd.to_datetime(trucks['available_at'], utc=True)
+        trucks['available_at'] = (times - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+    return trucks
+
+
+class _Partition:
+    """Rows of one equipment type sorted by (origin cell, pickup time)
+
+    The columns a ranking reads are copied in the same order, so a cell's
+    candidates are contiguous in memory.
+    """
+
+    def __init__(self, matcher, rows):
+        # Cells are at most 2**17, pickups span far less than 2**46 ms
+        keys = matcher.cells[rows] * matcher.span + (matcher.pickups[rows] - matcher.first_pickup)
+        order = np.argsort(keys, kind='stable')
+        self.rows = rows[order]
+        self.keys = keys[order]
+        self.pickups = matcher.pickups[self.rows]
+        self.latitudes = matcher.filter_index.origin.latitudes[self.rows]
+        self.longitudes = matcher.filter_index.origin.longitudes[self.rows]
+        self.rate = matcher.rate[self.rows]
+        self.distance = matcher.distance[self.rows]
+
+
+class LoadMatcher:
+    """Top-K loads per truck from a frame and its FilterIndex"""
+
+    def __init__(self, df, filter_index):
+        self.df = df
+        self.filter_index = filter_index
+        self.rate = df['rate_dollars'].to_numpy(dtype=np.float64)
+        self.distance = df['distanceMiles'].to_numpy(dtype=np.float64, na_value=np.nan)
+        # Loads without a pickup time are left out of every partition
+        self.has_pickup = ~np.isnan(filter_index.pickup.values)
+        self.pickups = np.where(self.has_pickup, filter_index.pickup.values, 0).astype(np.int64)
+        first, last = filter_index.pickup.value_range()
+        self.first_pickup = int(first)
+        self.span = int(last) - self.first_pickup + 1
+        self.cells = filter_index.origin.cell_ids(filter_index.origin.latitudes, filter_index.origin.longitudes)
+        # Built on first use; None holds every equipment type
+        self.partitions = {}
+
+    def extended(self, df, filter_index):
+        """Return a matcher for the grown frame with the same partitions built"""
+        matcher = LoadMatcher(df, filter_index)
+        for code in self.partitions:
+            matcher._build_partition(code)
+        return matcher
+
+    def _build_partition(self, code):
+        if code is None:
+            rows = np.arange(len(self.pickups))
+        else:
+            rows = self.filter_index.equipment.rows(code).astype(np.int64)
+        self.partitions[code] = _Partition(self, rows[self.has_pickup[rows]])
+
+    def _partition(self, equipment):
+        code = None if equipment in (None, 'All') else self.filter_index.equipment.code(equipment)
+        if code not in self.partitions:
+            self._build_partition(code)
+        return self.partitions[code]
+
+    def _candidates(self, partition, lat, lon, available_at, max_deadhead):
+        """Positions in the partition of loads in cells near the truck with pickups from available_at on"""
+        # The grid works in great-circle miles; deadhead is road miles
+        starts, stops = self.filter_index.origin.cell_ranges(lat, lon, max_deadhead / ROAD_CIRCUITY)
+        cells = expand_ranges(starts, stops)
+        earliest = 0 if available_at is None else min(max(int(available_at) - self.first_pickup, 0), self.span)
+        first = np.searchsorted(partition.keys, cells * self.span + earliest)
+        last = np.searchsorted(partition.keys, (cells + 1) * self.span)
+        return expand_ranges(first, last)
+
+    def rank(self, lat, lon, equipment=None, available_at=None, max_deadhead=DEFAULT_MAX_DEADHEAD, k=DEFAULT_TOP_K):
+        """Return (rows, deadhead, total_miles, rate_per_total_mile) for the truck's best k loads, best first
+
+        available_at is epoch milliseconds; None means any pickup time.
+        """
+        partition = self._partition(equipment)
+        found = self._candidates(partition, lat, lon, available_at, max_deadhead)
+        deadhead = haversine_miles(partition.latitudes[found], partition.longitudes[found], lat, lon) * ROAD_CIRCUITY
+        total = partition.distance[found] + deadhead
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = partition.rate[found] / total
+        keep = np.isfinite(score) & (deadhead <= max_deadhead)
+        if available_at is not None:
+            keep &= partition.pickups[found] >= available_at + deadhead / DEADHEAD_MPH * HOUR_MS
+        rows, deadhead, total, score = partition.rows[found[keep]], deadhead[keep], total[keep], score[keep]
+
+        if len(rows) > k:
+            top = np.argpartition(-score, k - 1)[:k]
+            rows, deadhead, total, score = rows[top], deadhead[top], total[top], score[top]
+        # Best revenue per total mile first; less deadhead breaks ties
+        order = np.lexsort((deadhead, -score))
+        return rows[order], deadhead[order], total[order], score[order]
+
+    def _frame(self, rows, deadhead, total, score):
+        matches = self.df[MATCH_COLUMNS].take(rows).reset_index(drop=True)
+        matches['deadhead_miles'] = deadhead
+        matches['total_miles'] = total
+        matches['rate_per_total_mile'] = score
+        matches.insert(0, 'row', rows)
+        return matches
+
+    def match(self, lat, lon, equipment=None, available_at=None, max_deadhead=DEFAULT_MAX_DEADHEAD, k=DEFAULT_TOP_K):
+        """Return the truck's top k loads as a frame, best first"""
+        return self._frame(*self.rank(lat, lon, equipment, available_at, max_deadhead, k))
+
+    def match_fleet(self, trucks, k=DEFAULT_TOP_K):
+        """Return every truck's top k loads as one frame with truck and rank columns
+
+        trucks has lat and lon columns and optionally truck_id, equipment,
+        available_at (epoch ms) and max_deadhead. Each truck is ranked on
+        its own, so two trucks may share a load.
+        """
+        trucks = trucks.reset_index(drop=True)
+        columns = {name: trucks[name] if name in trucks else pd.Series(default, index=trucks.index, dtype=object)
+                   for name, default in TRUCK_DEFAULTS.items()}
+        truck_ids = trucks['truck_id'] if 'truck_id' in trucks else pd.Series(trucks.index)
+
+        found = []
+        for lat, lon, equipment, available_at, max_deadhead in zip(
+            trucks['lat'].tolist(), trucks['lon'].tolist(), *(columns[name].tolist() for name in TRUCK_DEFAULTS)
+        ):
+            found.append(self.rank(
+                float(lat),
+                float(lon),
+                None if pd.isna(equipment) else equipment,
+                None if pd.isna(available_at) else int(available_at),
+                DEFAULT_MAX_DEADHEAD if pd.isna(max_deadhead) else float(max_deadhead),
+                k,
+            ))
+
+        # One frame for the whole fleet instead of one per truck
+        counts = np.array([len(result[0]) for result in found], dtype=np.int64)
+        parts = [np.concatenate([result[part] for result in found]) if found else np.zeros(0) for part in range(4)]
+        matches = self._frame(parts[0].astype(np.int64), *parts[1:])
+        matches.insert(0, 'rank', np.concatenate([np.arange(1, count + 1) for count in counts]) if found else [])
+        matches.insert(0, 'truck_id', np.repeat(truck_ids.to_numpy(), counts))
+        return matches
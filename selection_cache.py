@@ -0,0 +1,143 @@
+"""
+Bounded LRU cache of sidebar selection results
+
+Maps a normalized (equipment, state, company, rate, posted and pickup
+time range, origin and destination radius) selection to the
+filtered row positions and the aggregates computed for them, so sessions
+flipping between the same combinations reuse each other's work.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Environment variable capping the cache size in megabytes
+CACHE_MB_ENV = "DASHBOARD_SELECTION_CACHE_MB"
+DEFAULT_CACHE_MB = 256
+
+
+def cache_limit_bytes():
+    return int(float(os.environ.get(CACHE_MB_ENV) or DEFAULT_CACHE_MB) * 1024 * 1024)
+
+
+class SelectionKey(namedtuple('SelectionKey', [
+    'equipment', 'state', 'company', 'rate', 'posted', 'pickup', 'origin_radius', 'destination_radius',
+])):
+    """A normalized selection, with None for every filter that is not applied"""
+
+    __slots__ = ()
+
+    @property
+    def category_only(self):
+        """Whether only the equipment, state and company filters can be set"""
+        return all(value is None for value in (
+            self.rate, self.posted, self.pickup, self.origin_radius, self.destination_radius,
+        ))
+
+
+def normalize_selection(equipment, state, company, rate_range, full_rate_range,
+                        posted_range=None, pickup_range=None, origin_radius=None, destination_radius=None):
+    """Build a hashable SelectionKey, treating 'All' and the full rate range as no filter
+
+    Time ranges are epoch milliseconds and radii (lat, lon, miles), or
+    None when not filtering.
+    """
+    def choice(value):
+        return None if value in (None, 'All') else value
+
+    def time_key(time_range):
+        return None if time_range is None else (int(time_range[0]), int(time_range[1]))
+
+    def radius_key(radius):
+        return None if radius is None else tuple(round(float(value), 4) for value in radius)
+
+    rate_key = None
+    if rate_range is not None and tuple(rate_range) != tuple(full_rate_range):
+        rate_key = (round(float(rate_range[0]), 2), round(float(rate_range[1]), 2))
+    return SelectionKey(choice(equipment), choice(state), choice(company), rate_key,
+                        time_key(posted_range), time_key(pickup_range),
+                        radius_key(origin_radius), radius_key(destination_radius))
+
+
+def estimate_size(value):
+    """Approximate the memory held by a cached value in bytes"""
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sum(estimate_size(item) for item in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+
+class SelectionCache:
+    """Thread-safe LRU cache evicting least recently used entries past a byte budget"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = cache_limit_bytes() if max_bytes is None else max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Too large to keep; serve it once without caching
+                return value
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss
+
+        The computation runs outside the lock, so two sessions missing on
+        the same key at once may both compute it.
+        """
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
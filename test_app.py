@@ -5,11 +5,39 @@ Simple test script to verify the dashboard app works correctly
 
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
 
-from app import load_data
+from app import build_scatter_figure, load_data
+from aggregates import AggregateEngine
+from charts import (
+    SCATTER_POINT_BUDGET_ENV, box_figure, box_stats, choose_scatter_mode, density_figure, histogram_counts, histogram_figure, map_points,
+    sorted_histogram_counts, stratified_sample
+)
+from data_table import page_count, page_frame, row_count, search_rows, sort_rows
+from dataset import Dataset, DatasetStore, scan_source
+from data_source import (
+    DATA_SOURCE_ENV, enrich_postings, frame_from_postings, iter_json_postings, read_postings, resolve_source,
+    read_enriched_postings
+)
+from filter_index import INDEXES, FilterIndex
+from matching import DEADHEAD_MPH, read_fleet
+from geo import (
+    ROAD_CIRCUITY, GridIndex, deadhead_miles, haversine_miles, lane_miles, nearest_miles, place_coordinates,
+    road_miles
+)
+import frame_cache
+from selection_cache import SelectionCache, normalize_selection
+import io
+import json
+import tempfile
+import time
+from datetime import timedelta
+import numpy as np
 import pandas as pd
 
+SAMPLE_FILE = os.path.join(HERE, 'nextload.json')
+
 def test_data_loading():
     """Test that data loads correctly"""
     print("Testing data loading...")
@@ -55,6 +83,934 @@ def test_data_processing():
     
     return True
 
+def test_file_sources():
+    """Test streaming JSON, JSON Lines and directory sources"""
+    print("\nTesting file data sources...")
+    with open(SAMPLE_FILE) as f:
+        postings = json.load(f)['load_postings']
+    expected = pd.DataFrame(postings)
+
+    df = read_postings(SAMPLE_FILE)
+    assert len(df) == len(postings)
+    assert df['id'].tolist() == expected['id'].tolist()
+    assert df['companyName'].tolist() == expected['companyName'].tolist()
+    assert df['rateCents'].dtype == 'int64'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'a.jsonl'), 'w') as f:
+            for posting in postings[:10]:
+                f.write(json.dumps(posting) + '\n')
+            # A line still being written is skipped, not a parse error
+            f.write(json.dumps(postings[10])[:30])
+        with open(os.path.join(tmp, 'b.json'), 'w') as f:
+            json.dump({"load_postings": postings[10:25], "timestamp": 0, "total": 15}, f)
+
+        df = read_postings(tmp)
+        assert df['id'].tolist() == expected['id'].tolist()[:25]
+
+        # Floats split across chunk boundaries at '.' or 'e' decode whole
+        dump = os.path.join(tmp, 'floats.json')
+        with open(dump, 'w') as f:
+            f.write('{"timestamp": 12.5, "load_postings": [{"id": 1, "rate": 2.5e3}, {"id": 2, "rate": -3E-2}], '
+                    '"total": 2}')
+        for chunk_size in [1, 2, 4, 7, 14, 28]:
+            assert list(iter_json_postings(dump, chunk_size)) == [{"id": 1, "rate": 2500.0}, {"id": 2, "rate": -0.03}]
+        os.remove(dump)
+
+        loaded = load_data(tmp)
+        assert len(loaded) == 25 and 'route' in loaded.columns
+
+        # A failed load is not cached: the next call retries
+        later = os.path.join(tmp, 'later.jsonl')
+        assert load_data(later).empty
+        with open(later, 'w') as f:
+            f.writelines(json.dumps(posting) + '\n' for posting in postings[:5])
+        assert len(load_data(later)) == 5
+
+    print("SUCCESS: File, JSON Lines and directory sources working")
+    return True
+
+def test_parallel_parsing():
+    """Test that parsing files across a process pool matches a serial read"""
+    print("\nTesting parallel multi-file parsing...")
+    with open(SAMPLE_FILE) as f:
+        postings = json.load(f)['load_postings']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for day, start in enumerate(range(0, len(postings), 30)):
+            paths.append(os.path.join(tmp, f'day{day}.json'))
+            with open(paths[-1], 'w') as f:
+                json.dump({"load_postings": postings[start:start + 30], "timestamp": 0, "total": 30}, f)
+
+        serial = read_postings(tmp, workers=1)
+        parallel = read_postings(tmp, workers=2)
+        pd.testing.assert_frame_equal(serial, parallel)
+        assert parallel['id'].tolist() == [posting['id'] for posting in postings]
+
+        # A list of files is a source too, also from the environment
+        assert read_postings(paths[:2], workers=2)['id'].tolist() == parallel['id'].tolist()[:60]
+        os.environ[DATA_SOURCE_ENV] = os.pathsep.join(paths[2:])
+        try:
+            assert resolve_source() == tuple(paths[2:])
+        finally:
+            del os.environ[DATA_SOURCE_ENV]
+
+    print("SUCCESS: Parallel parsing matches serial parsing")
+    return True
+
+def test_sample_generator():
+    """Test the seeded, chunked synthetic posting generator"""
+    print("\nTesting synthetic data generator...")
+    from create_sample_data import COMPANIES, iter_posting_chunks, write_postings
+
+    chunks = list(iter_posting_chunks(2500, chunk_size=1000, seed=7, base_timestamp=1760000000000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    again = next(iter_posting_chunks(1000, chunk_size=1000, seed=7, base_timestamp=1760000000000))
+    assert chunks[0].equals(again)
+    generated = pd.concat(chunks, ignore_index=True)
+    assert generated['id'].is_unique
+    assert (generated['originCity'] != generated['destinationCity']).all()
+    assert (generated['pickupTimestamp'] > generated['postedTimestamp']).all()
+    assert (generated['postedTimestamp'] <= 1760000000000 + 24 * 60 * 60 * 1000).all()
+    # Volume is skewed towards a few carriers
+    assert generated['companyName'].value_counts(normalize=True).iloc[0] > 2 / len(COMPANIES)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'postings.jsonl')
+        assert write_postings(path, 2500, chunk_size=1000, seed=7, base_timestamp=1760000000000) == 2500
+        df = read_postings(path)
+        assert df['id'].tolist() == generated['id'].tolist()
+        assert df['companyPhone'].tolist() == generated['companyPhone'].tolist()
+        assert df['rateCents'].tolist() == generated['rateCents'].tolist()
+        assert df['contactName'].isna().all()
+
+    print("SUCCESS: Generator is seeded, chunked and readable")
+    return True
+
+def test_frame_cache():
+    """Test the on-disk processed frame cache"""
+    print("\nTesting processed frame cache...")
+    calls = []
+
+    def build(source):
+        calls.append(source)
+        return read_enriched_postings(source)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ[frame_cache.CACHE_DIR_ENV] = tmp
+        try:
+            first = frame_cache.load_or_build(SAMPLE_FILE, build)
+            second = frame_cache.load_or_build(SAMPLE_FILE, build)
+        finally:
+            del os.environ[frame_cache.CACHE_DIR_ENV]
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+    # A feed that grows during the build is cached under its size before the build
+    with open(SAMPLE_FILE) as handle:
+        postings = json.load(handle)['load_postings']
+
+    def growing_build(source):
+        frame = read_enriched_postings(source)
+        with open(source, 'a') as handle:
+            handle.writelines(json.dumps(posting) + '\n' for posting in postings[10:20])
+        return frame
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ[frame_cache.CACHE_DIR_ENV] = os.path.join(tmp, 'cache')
+        try:
+            feed = os.path.join(tmp, 'feed.jsonl')
+            with open(feed, 'w') as handle:
+                handle.writelines(json.dumps(posting) + '\n' for posting in postings[:10])
+            before = frame_cache.cache_path(feed)
+            assert len(frame_cache.load_or_build(feed, growing_build)) == 10
+            assert os.path.exists(before) and frame_cache.read_cached_frame(feed) is None
+            assert len(frame_cache.load_or_build(feed, read_enriched_postings)) == 20
+        finally:
+            del os.environ[frame_cache.CACHE_DIR_ENV]
+    print("SUCCESS: Cached frame round-trips without rebuilding")
+    return True
+
+def test_dtype_schema():
+    """Test categorical and downcast column dtypes"""
+    print("\nTesting dtype schema...")
+    df = load_data(SAMPLE_FILE)
+
+    for column in ['equipmentType', 'companyName', 'originState', 'destinationState', 'route']:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype), column
+    assert df['originState'].dtype == df['destinationState'].dtype
+    assert df['originCity'].dtype == df['destinationCity'].dtype
+    assert df['length'].dtype.itemsize < 8 and df['weight'].dtype.itemsize < 8
+    assert df['viewed'].dtype == bool
+
+    memory_usage = df.attrs['memory_usage']
+    assert memory_usage['before'] > 0 and memory_usage['after'] > 0
+    print(f"SUCCESS: Memory {memory_usage['before']:,} -> {memory_usage['after']:,} bytes")
+    return True
+
+
+def test_route_lanes():
+    """Test integer lane IDs behind the route column"""
+    print("\nTesting route lanes...")
+    df = load_data(SAMPLE_FILE)
+    with open(SAMPLE_FILE) as f:
+        expected = pd.DataFrame(json.load(f)['load_postings'])
+    labels = (expected['originCity'] + ', ' + expected['originState'] + ' → '
+              + expected['destinationCity'] + ', ' + expected['destinationState'])
+
+    assert df['route'].astype(str).tolist() == labels.tolist()
+    assert df['route'].cat.categories.is_unique
+
+    # The busiest lanes are counted on the integer codes
+    counts = AggregateEngine(df).baseline['route_counts'].head(5)
+    assert counts.tolist() == labels.value_counts().head(5).tolist()
+    assert counts.index[0] == labels.value_counts().index[0]
+    print("SUCCESS: Route lanes match string routes")
+    return True
+
+
+def test_filter_index():
+    """Test indexed sidebar filters against plain boolean masks"""
+    print("\nTesting filter index...")
+    df = load_data(SAMPLE_FILE)
+    index = FilterIndex(df)
+    # Indexes are built on first use only
+    assert 'rate' not in vars(index) and index.rate.present == df['rate_dollars'].notna().sum()
+    assert 'rate' in vars(index) and 'origin' not in vars(index)
+
+    def expected_rows(equipment, state, company, rate_range, posted_range=None, pickup_range=None,
+                      origin_radius=None, destination_radius=None):
+        mask = (df['rate_dollars'] >= rate_range[0]) & (df['rate_dollars'] <= rate_range[1])
+        for prefix, radius in [('origin', origin_radius), ('destination', destination_radius)]:
+            if radius is not None:
+                lat, lon, miles = radius
+                mask &= haversine_miles(df[f'{prefix}Latitude'], df[f'{prefix}Longitude'], lat, lon) <= miles
+        for column, time_range in [('postedTimestamp', posted_range), ('pickupTimestamp', pickup_range)]:
+            if time_range is not None:
+                mask &= (df[column] >= time_range[0]) & (df[column] <= time_range[1])
+        if equipment != 'All':
+            mask &= df['equipmentType'] == equipment
+        if state != 'All':
+            mask &= (df['originState'] == state) | (df['destinationState'] == state)
+        if company != 'All':
+            mask &= df['companyName'] == company
+        return list(np.flatnonzero(mask.to_numpy()))
+
+    full_range = (float(df['rate_dollars'].min()), float(df['rate_dollars'].max()))
+    assert index.select('All', 'All', 'All', full_range) is None
+    posted = df['postedTimestamp']
+    pickup = df['pickupTimestamp']
+    assert index.select('All', 'All', 'All', full_range, (posted.min(), posted.max())) is None
+
+    hour = 3_600_000
+    last_six_hours = (posted.max() - 6 * hour, posted.max())
+    pickup_window = (pickup.quantile(0.25), pickup.quantile(0.75))
+    chicago = (41.8781, -87.6298, 300.0)
+    selections = [
+        ('Reefer', 'All', 'All', full_range),
+        ('All', 'IL', 'All', full_range),
+        ('Dry Van', 'PA', 'Koola Logistics LLC', (500.0, 2500.0)),
+        ('All', 'All', 'All', (1000.0, 1500.0)),
+        ('Unknown', 'All', 'All', full_range),
+        ('All', 'All', 'All', full_range, last_six_hours),
+        ('Reefer', 'All', 'All', (500.0, 2500.0), None, pickup_window),
+        ('All', 'TX', 'All', full_range, (posted.min(), posted.median()), pickup_window),
+        ('All', 'All', 'All', full_range, (0, 1)),
+        ('All', 'All', 'All', full_range, None, None, chicago),
+        ('Dry Van', 'All', 'All', full_range, None, None, chicago, (32.7767, -96.7970, 800.0)),
+    ]
+    for selection in selections:
+        rows = index.select(*selection)
+        rows = range(len(df)) if rows is None else rows
+        assert list(rows) == expected_rows(*selection), selection
+    assert all(len(expected_rows(*selections[i])) > 0 for i in (-4, -2, -1))
+
+    print("SUCCESS: Filter index matches boolean masks")
+    return True
+
+
+def test_spatial_index():
+    """Test grid radius searches against distances to every row"""
+    print("\nTesting spatial index...")
+    # Chicago to New York is about 711 miles
+    assert abs(haversine_miles(41.8781, -87.6298, 40.7128, -74.0060) - 711) < 5
+    assert np.allclose(haversine_miles([0.0, 10.0], [0.0, 20.0], [0.0, 10.0], [0.0, 20.0]), 0.0)
+
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(-89, 89, 20000)
+    lons = rng.uniform(-180, 180, 20000)
+    lats[:10] = np.nan
+    index = GridIndex(lats, lons)
+    # Mid-latitudes, near a pole, across the antimeridian and larger than the globe
+    for lat, lon, miles in [(40.0, -100.0, 250), (85.0, 10.0, 400), (10.0, 179.5, 300), (0.0, 0.0, 20000)]:
+        expected = np.flatnonzero(haversine_miles(lats, lons, lat, lon) <= miles)
+        rows = index.rows(lat, lon, miles)
+        assert rows.tolist() == expected.tolist(), (lat, lon, miles)
+        assert index.candidate_count(lat, lon, miles) >= len(rows)
+    assert index.candidate_count(40.0, -100.0, 250) < len(lats) / 10
+
+    # Appended coordinates land in their cells
+    more = GridIndex(lats[:15000], lons[:15000]).extended(lats, lons)
+    assert more.rows(40.0, -100.0, 500).tolist() == index.rows(40.0, -100.0, 500).tolist()
+
+    df = load_data(SAMPLE_FILE)
+    places = place_coordinates(df)
+    assert not places.empty and places.index.is_monotonic_increasing
+    print("SUCCESS: Spatial index matches brute-force distances")
+    return True
+
+
+def test_deadhead():
+    """Test chunked nearest-truck deadhead against a full distance matrix"""
+    print("\nTesting deadhead...")
+    df = load_data(SAMPLE_FILE)
+    rng = np.random.default_rng(1)
+    truck_lats = rng.uniform(26, 48, 37)
+    truck_lons = rng.uniform(-122, -70, 37)
+
+    full = haversine_miles(truck_lats[:, None], truck_lons[:, None],
+                           df['originLatitude'].to_numpy()[None, :], df['originLongitude'].to_numpy()[None, :])
+    # Small chunks force several passes over the loads
+    miles, nearest = nearest_miles(truck_lats, truck_lons, df['originLatitude'], df['originLongitude'],
+                                   chunk_elements=len(truck_lats) * 7)
+    assert np.allclose(miles, full.min(axis=0)) and (nearest == full.argmin(axis=0)).all()
+
+    end = (41.8781, -87.6298)
+    origin_deadhead, destination_deadhead, truck = deadhead_miles(df, truck_lats, truck_lons, end)
+    assert np.allclose(origin_deadhead, full.min(axis=0) * ROAD_CIRCUITY)
+    assert np.allclose(destination_deadhead, road_miles(df['destinationLatitude'], df['destinationLongitude'], *end))
+    assert (deadhead_miles(df, truck_lats, truck_lons)[1] == 0).all()
+
+    # Lane distances missing from the feed are filled from the coordinates
+    with open(SAMPLE_FILE) as handle:
+        postings = json.load(handle)['load_postings'][:20]
+    for posting in postings[:5]:
+        posting['distanceMiles'] = None
+    enriched = enrich_postings(frame_from_postings(postings))
+    assert enriched['distanceMiles'].notna().all()
+    assert np.allclose(enriched['distanceMiles'][:5], np.rint(lane_miles(enriched)[:5]))
+    assert (enriched['distanceMiles'][5:].to_numpy() == [posting['distanceMiles'] for posting in postings[5:]]).all()
+    print("SUCCESS: Deadhead matches brute-force distances")
+    return True
+
+
+def test_load_matching():
+    """Test truck-to-load ranking against scoring every load"""
+    print("\nTesting load matching...")
+    dataset = Dataset(load_data(SAMPLE_FILE))
+    df = dataset.df
+    matcher = dataset.matcher()
+    pickups = df['pickupTimestamp'].to_numpy()
+
+    def expected(lat, lon, equipment, available_at, max_deadhead, k):
+        deadhead = road_miles(df['originLatitude'], df['originLongitude'], lat, lon)
+        ok = deadhead <= max_deadhead
+        if equipment is not None:
+            ok &= (df['equipmentType'] == equipment).to_numpy()
+        if available_at is not None:
+            ok &= pickups >= available_at + deadhead / DEADHEAD_MPH * 3_600_000
+        score = df['rate_dollars'].to_numpy() / (df['distanceMiles'].to_numpy() + deadhead)
+        rows = np.flatnonzero(ok)
+        return rows[np.lexsort((deadhead[rows], -score[rows]))][:k]
+
+    trucks = [
+        (41.8781, -87.6298, None, None, 300.0, 5),
+        (32.7767, -96.7970, 'Dry Van', None, 500.0, 10),
+        (34.0522, -118.2437, 'Reefer', int(np.median(pickups)), 2000.0, 3),
+        (0.0, 0.0, None, None, 150.0, 5),
+    ]
+    for truck in trucks:
+        matches = matcher.match(*truck)
+        assert matches['row'].tolist() == expected(*truck).tolist(), truck
+        assert matches['rate_per_total_mile'].is_monotonic_decreasing
+        assert (matches['deadhead_miles'] <= truck[4]).all()
+    assert len(matcher.match(*trucks[0])) == 5 and matcher.match(*trucks[-1]).empty
+
+    # A load without a pickup time is skipped instead of breaking the partition keys
+    partial = df.head(20).copy()
+    anywhere = (41.8781, -87.6298, None, None, 5000.0, 20)
+    missing = Dataset(partial).matcher().match(*anywhere)['row'].iloc[0]
+    partial.iloc[missing, partial.columns.get_loc('pickupTimestamp')] = np.nan
+    partial_matcher = Dataset(partial).matcher()
+    assert 0 < partial_matcher.span < 2 ** 46
+    rows = partial_matcher.match(*anywhere)['row'].tolist()
+    assert missing not in rows and len(rows) > 0
+
+    # A fleet gets the same answers as matching its trucks one at a time
+    fleet_csv = (
+        "truck_id,lat,lon,equipment,available_at,max_deadhead\n"
+        "t1,41.8781,-87.6298,,,300\n"
+        "t2,32.7767,-96.7970,Dry Van,,500\n"
+        f"t3,34.0522,-118.2437,Reefer,{pd.Timestamp(int(np.median(pickups)), unit='ms').isoformat()},2000\n"
+    )
+    fleet = read_fleet(io.StringIO(fleet_csv))
+    assert fleet['available_at'].iloc[2] == int(np.median(pickups))
+    matches = matcher.match_fleet(fleet, k=3)
+    for truck_id, truck in zip(['t1', 't2', 't3'], trucks):
+        rows = matches.loc[matches['truck_id'] == truck_id, 'row'].tolist()
+        assert rows == expected(*truck[:5], 3).tolist(), truck_id
+    for truck_id, ranks in matches.groupby('truck_id')['rank']:
+        assert ranks.tolist() == list(range(1, len(ranks) + 1)), truck_id
+    assert (matches['truck_id'] == 't1').sum() == 3
+    assert matcher.match_fleet(fleet.iloc[:0]).empty
+    try:
+        read_fleet(io.StringIO("truck_id,lat\nt1,40.0\n"))
+        assert False, "a fleet without lon should be rejected"
+    except ValueError:
+        pass
+    print("SUCCESS: Load matching ranks like a full scan")
+    return True
+
+
+def test_shared_frame():
+    """Test that reruns reuse the loaded frame instead of copying it"""
+    print("\nTesting shared frame...")
+    df = load_data(SAMPLE_FILE)
+    assert load_data(SAMPLE_FILE) is df
+    assert 'posted_date_only' in df.columns and 'pickup_date_only' in df.columns
+    assert (df['posted_date_only'] <= df['posted_date']).all()
+    print("SUCCESS: Frame is shared across reruns")
+    return True
+
+
+def test_selection_cache():
+    """Test LRU hits, misses and size-based eviction"""
+    print("\nTesting selection cache...")
+    full_range = (0.0, 100.0)
+    key = normalize_selection('All', 'TX', 'All', (0.0, 100.0), full_range)
+    assert key == (None, 'TX', None, None, None, None, None, None)
+    assert key.state == 'TX' and key.category_only
+    key = normalize_selection('Reefer', 'All', 'All', (10.0, 50.0), full_range, posted_range=(1000.0, 2000.0),
+                              destination_radius=(41.878114, -87.629798, 100))
+    assert key == ('Reefer', None, None, (10.0, 50.0), (1000, 2000), None, None, (41.8781, -87.6298, 100.0))
+    assert key.posted == (1000, 2000) and not key.category_only
+
+    cache = SelectionCache(max_bytes=3000)
+    calls = []
+
+    def compute(n):
+        calls.append(n)
+        return {'rows': np.arange(n, dtype=np.int64)}
+
+    cache.get_or_compute('a', lambda: compute(100))
+    cache.get_or_compute('a', lambda: compute(100))
+    assert calls == [100]
+
+    cache.get_or_compute('b', lambda: compute(200))
+    cache.get_or_compute('c', lambda: compute(200))
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 3
+    assert stats['evictions'] >= 1 and stats['bytes'] <= 3000
+    assert 'a' not in cache.entries and 'c' in cache.entries
+    print("SUCCESS: Selection cache hits and evicts")
+    return True
+
+
+def test_aggregate_engine():
+    """Test single-pass summaries against pandas aggregations"""
+    print("\nTesting aggregate engine...")
+    df = load_data(SAMPLE_FILE)
+    engine = AggregateEngine(df)
+    rows = FilterIndex(df).select(equipment='Reefer')
+
+    for selected in (None, rows):
+        subset = df if selected is None else df.take(selected)
+        summary = engine.baseline if selected is None else engine.summarize(selected)
+
+        assert summary['count'] == len(subset)
+        assert np.isclose(summary['avg_rate'], subset['rate_dollars'].mean())
+        assert summary['total_distance'] == subset['distanceMiles'].sum()
+        assert summary['unique_companies'] == subset['companyName'].nunique()
+
+        expected_rates = subset.groupby('equipmentType', observed=True)['rate_dollars'].mean()
+        assert np.allclose(summary['avg_rate_by_equipment'].sort_index(), expected_rates.sort_index())
+
+        expected_metrics = subset.groupby('companyName', observed=True).agg({
+            'rate_dollars': ['mean', 'count'],
+            'distanceMiles': 'mean',
+            'weight': 'mean'
+        }).round(2)
+        metrics = summary['company_metrics']
+        assert np.allclose(
+            metrics['Avg_Distance'].sort_index(),
+            expected_metrics[('distanceMiles', 'mean')].loc[metrics.index].sort_index()
+        )
+        assert summary['daily_counts']['Load_Count'].tolist() == subset.groupby('posted_date_only').size().tolist()
+
+    print("SUCCESS: Aggregate engine matches pandas")
+    return True
+
+
+def test_aggregate_cube():
+    """Test that cube summaries match summarizing the filtered rows"""
+    print("\nTesting aggregate cube...")
+    with open(SAMPLE_FILE) as handle:
+        postings = json.load(handle)['load_postings']
+    dataset = Dataset(read_enriched_postings(SAMPLE_FILE))
+    cube = dataset.cube
+    assert cube.size <= len(dataset) and int(cube.weights.sum()) == len(dataset)
+
+    def check(dataset, equipment='All', state='All', company='All'):
+        expected = dataset.aggregate_engine.summarize(
+            dataset.filter_index.select(equipment=equipment, state=state, company=company)
+        )
+        summary = dataset.cube.summarize(dataset.cube.select(equipment, state, company))
+        for key in ['count', 'total_distance', 'unique_companies']:
+            assert summary[key] == expected[key], key
+        assert np.isclose(summary['avg_rate'], expected['avg_rate'], equal_nan=True)
+        for key in ['route_counts', 'equipment_counts', 'company_counts']:
+            assert dict(summary[key]) == dict(expected[key]), key
+        assert np.allclose(summary['avg_rate_by_equipment'].fillna(0), expected['avg_rate_by_equipment'].fillna(0))
+        metrics = summary['company_metrics'].sort_index()
+        expected_metrics = expected['company_metrics'].sort_index()
+        assert metrics.index.tolist() == expected_metrics.index.tolist()
+        assert np.allclose(metrics.to_numpy(dtype=float), expected_metrics.to_numpy(dtype=float))
+        assert summary['daily_counts'].equals(expected['daily_counts'])
+        assert summary['pickup_counts'].equals(expected['pickup_counts'])
+
+    company = dataset.df['companyName'].value_counts().index[0]
+    selections = [{}, {'equipment': 'Reefer'}, {'state': 'TX'}, {'company': company},
+                  {'equipment': 'Dry Van', 'state': 'CA'}, {'state': 'Nowhere'}]
+    for selection in selections:
+        check(dataset, **selection)
+
+    # The cube grows with appended postings like the engine does
+    small = Dataset(read_enriched_postings(SAMPLE_FILE).head(50).reset_index(drop=True))
+    grown, added = small.append(postings[40:])
+    assert added == len(postings) - 50
+    for selection in selections:
+        check(grown, **selection)
+    print("SUCCESS: Aggregate cube matches row summaries")
+    return True
+
+
+def test_map_points():
+    """Test coordinate aggregation and grid binning for the load map"""
+    print("\nTesting map point aggregation...")
+    df = load_data(SAMPLE_FILE)
+    distinct = df.groupby(['originLatitude', 'originLongitude']).size()
+
+    points, mode = map_points(df, 'origin', grid_threshold=len(df))
+    assert mode == 'locations'
+    assert len(points) == len(distinct)
+    assert points['count'].sum() == len(df)
+    assert sorted(points['count']) == sorted(distinct)
+
+    grid, mode = map_points(df, 'origin', grid_threshold=10, cell_degrees=5.0)
+    assert mode == 'grid'
+    assert len(grid) < len(points)
+    assert grid['count'].sum() == len(df)
+    print(f"SUCCESS: {len(df)} rows -> {len(points)} locations -> {len(grid)} grid cells")
+    return True
+
+
+def test_histograms():
+    """Test server-side histogram bins against numpy"""
+    print("\nTesting pre-binned histograms...")
+    df = load_data(SAMPLE_FILE)
+    index = FilterIndex(df)
+    rates = df['rate_dollars'].to_numpy()
+
+    for low, high in [(0.0, 1e9), (1000.0, 3000.0)]:
+        start, stop = index.rate.bounds(low, high)
+        counts, edges = sorted_histogram_counts(index.rate.sorted_values, start, stop, bins=20)
+        selected = rates[(rates >= low) & (rates <= high)]
+        expected_counts, expected_edges = np.histogram(selected, bins=20)
+        assert counts.tolist() == expected_counts.tolist()
+        assert np.allclose(edges, expected_edges)
+
+    counts, edges = histogram_counts(df['rate_per_mile_dollars'], bins=20)
+    assert counts.sum() == df['rate_per_mile_dollars'].notna().sum()
+    fig = histogram_figure(counts, edges, "Rate per Mile", "Rate per Mile ($)")
+    assert len(fig.data[0].y) == 20
+    print("SUCCESS: Histogram bins match numpy")
+    return True
+
+
+def test_box_stats():
+    """Test server-side box plot statistics against pandas quantiles"""
+    print("\nTesting weight box statistics...")
+    df = load_data(SAMPLE_FILE)
+    engine = AggregateEngine(df)
+    labels = engine.equipment_labels
+
+    for rows in [None, np.arange(0, len(df), 3), np.array([1, 4, 9])]:
+        sorted_weights, bounds = engine.weight_by_equipment(rows)
+        stats = box_stats(sorted_weights, bounds, labels, max_outliers=2)
+        subset = df if rows is None else df.iloc[rows]
+        expected = subset.dropna(subset=['weight']).groupby('equipmentType', observed=True)['weight']
+        assert [group['label'] for group in stats] == list(expected.size().index)
+        for group in stats:
+            weights = expected.get_group(group['label'])
+            q1, median, q3 = weights.quantile([0.25, 0.5, 0.75])
+            assert group['count'] == len(weights)
+            assert np.allclose([group['q1'], group['median'], group['q3']], [q1, median, q3])
+            inside = weights[(weights >= q1 - 1.5 * (q3 - q1)) & (weights <= q3 + 1.5 * (q3 - q1))]
+            assert group['lower_fence'] == inside.min() and group['upper_fence'] == inside.max()
+            assert group['outlier_count'] == len(weights) - len(inside)
+            assert len(group['outliers']) == min(group['outlier_count'], 2)
+
+    # Outlier sampling keeps both extremes
+    values = np.array([-100.0, -90.0, -80.0] + [10.0] * 20 + [200.0, 300.0])
+    stats = box_stats(values, np.array([0, len(values)]), pd.Index(['Van']), max_outliers=2)
+    assert stats[0]['outlier_count'] == 5 and stats[0]['outliers'].tolist() == [-100.0, 300.0]
+    fig = box_figure(stats, "Weights", "Equipment", "Weight")
+    assert list(fig.data[0].q1) == [10.0] and len(fig.data[1].y) == 2
+    print("SUCCESS: Box statistics match pandas")
+    return True
+
+
+def test_scatter_modes():
+    """Test scatter mode selection, stratified sampling and the density view"""
+    print("\nTesting scatter sampling...")
+    assert choose_scatter_mode(100, 1000) == 'points'
+    assert choose_scatter_mode(5000, 1000) == 'sample'
+    assert choose_scatter_mode(50000, 1000) == 'density'
+    assert choose_scatter_mode(100, 1000, 'Sample') == 'points'
+    assert choose_scatter_mode(100, 1000, 'Density') == 'density'
+
+    df = load_data(SAMPLE_FILE)
+    groups = df['equipmentType'].cat.codes.to_numpy()
+    sample = stratified_sample(groups, df['distanceMiles'], df['rate_dollars'], 40)
+    assert len(sample) == 40 and len(np.unique(sample)) == 40
+    assert (np.diff(sample) > 0).all()
+    # Every equipment type stays represented and the extremes are kept
+    assert set(groups[sample]) == set(groups)
+    assert df['rate_dollars'].idxmax() in sample and df['distanceMiles'].idxmax() in sample
+    assert stratified_sample(groups, df['distanceMiles'], df['rate_dollars'], 1000).tolist() == list(range(len(df)))
+
+    fig = density_figure(groups, df['equipmentType'].cat.categories,
+                         df['distanceMiles'], df['rate_dollars'], "Density", "x", "y", bins=10)
+    total = sum(np.nansum(np.asarray(trace.z, dtype=float)) for trace in fig.data)
+    assert total == (df['distanceMiles'].notna() & df['rate_dollars'].notna()).sum()
+
+    # Every mode says how the chart was drawn and against which budget
+    assert 'as points (point budget 20,000)' in build_scatter_figure(df, 'Auto')['note']
+    os.environ[SCATTER_POINT_BUDGET_ENV] = '10'
+    try:
+        assert 'sample of 10 ' in build_scatter_figure(df, 'Sample')['note']
+        assert 'Density view' in build_scatter_figure(df, 'Density')['note']
+        assert all('point budget 10)' in build_scatter_figure(df, mode)['note'] for mode in ['Sample', 'Density'])
+    finally:
+        del os.environ[SCATTER_POINT_BUDGET_ENV]
+    print("SUCCESS: Scatter sampling works")
+    return True
+
+
+def test_data_table():
+    """Test server-side search, sort and paging against pandas"""
+    print("\nTesting paginated data table...")
+    df = load_data(SAMPLE_FILE)
+
+    # Sorting matches pandas, with missing values last
+    for column in ['rate_dollars', 'companyName', 'posted_date', 'referenceNumber']:
+        for ascending in (True, False):
+            ordered = sort_rows(df, None, column, ascending)
+            values = df[column].astype(str) if column == 'companyName' else df[column]
+            expected = values.sort_values(ascending=ascending, kind='stable', na_position='last')
+            assert df[column].take(ordered).isna().tolist() == df[column].loc[expected.index].isna().tolist()
+            assert df[column].take(ordered).dropna().tolist() == df[column].loc[expected.index].dropna().tolist()
+
+    # Search looks in categorical and plain text columns within the given rows
+    company = df['companyName'].dropna().iloc[0]
+    query = company[1:5].upper()
+    found = search_rows(df, None, query)
+    assert found.tolist() == np.flatnonzero(
+        df[['referenceNumber', 'route', 'equipmentType', 'companyName']].astype(str)
+        .apply(lambda column: column.str.contains(query, case=False, regex=False)).any(axis=1)
+    ).tolist()
+    subset = np.arange(0, len(df), 2)
+    assert set(search_rows(df, subset, query)) == set(found) & set(subset)
+    reference = df['referenceNumber'].iloc[7]
+    assert 7 in search_rows(df, None, reference)
+
+    # Pages cover every row exactly once and carry display labels
+    assert page_count(0, 25) == 1 and page_count(101, 25) == 5
+    ordered = sort_rows(df, None, 'rate_dollars')
+    pages = [page_frame(df, ordered, page, 30) for page in range(1, page_count(len(df), 30) + 1)]
+    assert sum(len(page) for page in pages) == len(df)
+    assert pages[0].index.tolist() == ordered[:30].tolist()
+    assert 'Rate ($)' in pages[0].columns
+
+    # None stands for every row in frame order and is never expanded
+    assert search_rows(df, None, ' ') is None and sort_rows(df, None, None) is None
+    assert row_count(df, None) == len(df) and row_count(df, subset) == len(subset)
+    assert page_frame(df, None, 2, 30).index.tolist() == df.index[30:60].tolist()
+    print("SUCCESS: Data table pages match pandas")
+    return True
+
+
+def test_incremental_ingest():
+    """Test that appending postings matches loading everything at once"""
+    print("\nTesting incremental ingest...")
+    with open(SAMPLE_FILE) as handle:
+        postings = json.load(handle)['load_postings']
+    full = Dataset(read_enriched_postings(SAMPLE_FILE))
+
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as cache_tmp:
+        os.environ[frame_cache.CACHE_DIR_ENV] = cache_tmp
+        feed = os.path.join(tmp, 'feed.jsonl')
+        with open(feed, 'w') as handle:
+            handle.writelines(json.dumps(posting) + '\n' for posting in postings[:55])
+        # Postings written after the source was statted and read are ingested by the first refresh
+        files = scan_source(tmp)
+        df = read_enriched_postings(feed)
+        with open(feed, 'a') as handle:
+            handle.writelines(json.dumps(posting) + '\n' for posting in postings[55:60])
+        store = DatasetStore(Dataset(df), tmp, cache_frames=True, files=files)
+        assert store.refresh() == 5 and store.refresh() == 0
+        # Build everything up front so the refreshes below extend it
+        first = store.current()
+        first.cube, first.ids
+        for name in INDEXES:
+            getattr(first.filter_index, name)
+        first.places()
+        first.matcher().match(41.8781, -87.6298, 'Reefer')
+
+        # Overlapping ids are skipped, and a half-written line waits for the next scan
+        with open(feed, 'a') as handle:
+            handle.writelines(json.dumps(posting) + '\n' for posting in postings[50:90])
+            handle.write(json.dumps(postings[90])[:20])
+        assert scan_source(tmp)[feed][2] == os.path.getsize(feed) - 20
+        assert store.refresh() == 30
+        with open(feed, 'a') as handle:
+            handle.write(json.dumps(postings[90])[20:] + '\n')
+        with open(os.path.join(tmp, 'dump.json'), 'w') as handle:
+            json.dump({'load_postings': postings[85:]}, handle)
+        assert store.refresh() == 10
+        assert store.refresh() == 0
+
+        # The grown frame is cached under the files' new fingerprint, and only that one is kept
+        try:
+            cached = frame_cache.read_cached_frame(tmp)
+            assert cached is not None and sorted(cached['id']) == sorted(store.current().df['id'])
+            assert len(os.listdir(cache_tmp)) == 1
+        finally:
+            del os.environ[frame_cache.CACHE_DIR_ENV]
+
+    dataset = store.current()
+    assert dataset.version == 3 and len(dataset) == len(full)
+    assert all(name in vars(dataset.filter_index) for name in INDEXES)
+
+    # Places and match partitions were grown with the rows, not left to the next rerun
+    assert dataset._places is not None and dataset._matcher is not None
+    assert dataset.places().index.tolist() == place_coordinates(dataset.df).index.tolist()
+    assert list(dataset._matcher.partitions) == list(first.matcher().partitions)
+    truck = (32.7767, -96.7970, 'Reefer', None, 1000.0, 10)
+    assert dataset.matcher().match(*truck)['row'].tolist() == Dataset(dataset.df).matcher().match(*truck)['row'].tolist()
+    assert sorted(dataset.df['id']) == sorted(full.df['id'])
+
+    # Indexes and aggregates agree with a full rebuild
+    rebuilt = Dataset(dataset.df)
+    posted = dataset.df['postedTimestamp']
+    for selection in [{}, {'equipment': 'Reefer'}, {'state': 'TX', 'rate_range': (1000.0, 3000.0)},
+                      {'posted_range': (posted.min(), posted.median())}]:
+        rows = dataset.filter_index.select(**selection)
+        expected = rebuilt.filter_index.select(**selection)
+        assert (rows is None and expected is None) or rows.tolist() == expected.tolist()
+        summary = dataset.aggregate_engine.summarize(rows)
+        assert summary['count'] == rebuilt.aggregate_engine.summarize(expected)['count']
+        weights, bounds = dataset.aggregate_engine.weight_by_equipment(rows)
+        expected_weights, expected_bounds = rebuilt.aggregate_engine.weight_by_equipment(expected)
+        assert weights.tolist() == expected_weights.tolist() and bounds.tolist() == expected_bounds.tolist()
+
+    baseline = dataset.aggregate_engine.baseline
+    expected = full.aggregate_engine.baseline
+    for key in ['count', 'total_distance', 'unique_companies']:
+        assert baseline[key] == expected[key], key
+    assert np.isclose(baseline['avg_rate'], expected['avg_rate'])
+    assert baseline['company_metrics'].sort_index().equals(expected['company_metrics'].sort_index())
+    assert baseline['daily_counts']['Load_Count'].tolist() == expected['daily_counts']['Load_Count'].tolist()
+    # Lanes tied on the last count may be picked in label order, which appends change
+    routes, expected_routes = baseline['route_counts'], expected['route_counts']
+    assert routes.tolist() == expected_routes.tolist()
+    assert dict(routes[routes > routes.min()]) == dict(expected_routes[expected_routes > expected_routes.min()])
+    print("SUCCESS: Incremental ingest matches a full load")
+    return True
+
+
+def test_background_refresh():
+    """Test that the watcher thread swaps in postings from new feed files"""
+    print("\nTesting background refresh...")
+    with open(SAMPLE_FILE) as handle:
+        postings = json.load(handle)['load_postings']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'first.json'), 'w') as handle:
+            json.dump({'load_postings': postings[:70]}, handle)
+        store = DatasetStore(Dataset(read_enriched_postings(tmp)), tmp)
+        before = store.current()
+        assert store.start_watcher(interval=0.05)
+        assert not store.start_watcher(interval=0.05)
+        try:
+            with open(os.path.join(tmp, 'second.json'), 'w') as handle:
+                json.dump({'load_postings': postings[60:]}, handle)
+            deadline = time.time() + 10
+            while store.current() is before and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            store.stop_watcher()
+
+    assert not store.watching
+    assert len(store.current()) == len(postings) and store.last_added == 30
+    # Snapshots handed out earlier are left untouched
+    assert len(before) == 70 and len(before.df) == 70
+    assert store.last_error is None and store.updated_at <= store.checked_at
+    print("SUCCESS: Watcher picks up new files")
+    return True
+
+
+def test_benchmark_harness():
+    """Test that the benchmark records every step and flags slowdowns"""
+    print("\nTesting benchmark harness...")
+    import benchmark
+
+    assert [benchmark.parse_size(size) for size in ['500', '10k', '1M']] == [500, 10_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        document = benchmark.run([500], tmp, repeat=1)
+    names = [row['name'] for row in document['results']]
+    assert 'load/parse+enrich' in names and 'table/sort+page/all' in names
+    assert f'match/fleet-{benchmark.FLEET_SIZE}' in names
+    cube_names = [name for name in names if name.startswith('filter/cube/')]
+    assert sum(name.startswith('filter/') for name in names) - len(cube_names) == 2 ** len(benchmark.FILTERS)
+    # Every combination of category filters alone also runs through the cube
+    assert len(cube_names) == 2 ** len(benchmark.CUBE_FILTERS)
+    assert all(row['seconds'] >= 0 and row['peak_mb'] >= 0 for row in document['results'])
+    json.dumps(document)
+
+    assert benchmark.compare(document['results'], document) == []
+    faster = {'results': [dict(row, seconds=row['seconds'] / 10) for row in document['results']]}
+    slow = [row for row in document['results'] if row['seconds'] * 0.9 > benchmark.MIN_REGRESSION_SECONDS]
+    regressions = benchmark.compare(document['results'], faster)
+    assert len(regressions) == len(slow) and all(row['ratio'] > 9 for row in regressions)
+
+    # Writing the results over the baseline would compare them with themselves
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.json')
+        with open(path, 'w') as f:
+            json.dump(document, f)
+        try:
+            benchmark.main(['--sizes', '500', '--repeat', '1', '--output', path, '--baseline', path])
+        except SystemExit as error:
+            assert error.code == 2
+        else:
+            raise AssertionError("same --output and --baseline was accepted")
+        with open(path) as f:
+            assert json.load(f) == json.loads(json.dumps(document))
+    print("SUCCESS: Benchmark harness works")
+    return True
+
+
+def test_run_timer():
+    """Test section timing, payload sizes and structured run logs"""
+    print("\nTesting timing instrumentation...")
+    import logging
+    from instrumentation import PROFILE_ENV, PROFILE_LOG_ENV, RunTimer, frame_bytes, profiling_enabled
+
+    assert not profiling_enabled({}) and profiling_enabled({'profile': '1'})
+    os.environ[PROFILE_ENV] = '1'
+    try:
+        assert profiling_enabled(None)
+    finally:
+        del os.environ[PROFILE_ENV]
+
+    disabled = RunTimer(False)
+    with disabled.section('load'):
+        pass
+    assert disabled.records == [] and disabled.frame().empty
+
+    timer = RunTimer(True)
+    with timer.section('load'):
+        time.sleep(0.01)
+    with timer.section('filter/select'):
+        pass
+    timings = timer.frame()
+    assert timings['section'].tolist() == ['load', 'filter/select']
+    assert timings['ms'].iloc[0] >= 10
+    assert frame_bytes(load_data(SAMPLE_FILE).head(10)[['id', 'rate_dollars']]) > 0
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger('dashboard.timing')
+    logger.addHandler(handler)
+    os.environ[PROFILE_LOG_ENV] = '1'
+    try:
+        timer.log(rows=5)
+    finally:
+        del os.environ[PROFILE_LOG_ENV]
+        logger.removeHandler(handler)
+    record = json.loads(records[0].getMessage())
+    assert record['rows'] == 5 and [item['section'] for item in record['sections']] == ['load', 'filter/select']
+    print("SUCCESS: Timing instrumentation works")
+    return True
+
+
+def test_dashboard_renders():
+    """Test that the dashboard script runs with and without filters"""
+    print("\nTesting dashboard rendering...")
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(HERE, 'app.py'), default_timeout=60).run()
+    assert not at.exception, at.exception
+    assert at.metric[0].value == f"{len(load_data()):,}"
+
+    # Picking truck locations adds the rate per total mile view
+    at.session_state['analytics_tab'] = at.tabs[1].label
+    at.run()
+    trucks = next(widget for widget in at.get('multiselect') if widget.key == "truck_places")
+    trucks.select(trucks.options[0]).select(trucks.options[1])
+    at.session_state['analytics_tab'] = at.tabs[1].label
+    at.run()
+    assert not at.exception, at.exception
+    assert any(metric.label == "Rate per Total Mile" for metric in at.metric)
+
+    at.sidebar.selectbox[0].select('Reefer').run()
+    assert not at.exception, at.exception
+
+    at.radio[0].set_value('Individual loads').run()
+    assert not at.exception, at.exception
+
+    # Radius search around one of the feed's cities
+    at.sidebar.selectbox(key="origin_place").select_index(2).run()
+    assert not at.exception, at.exception
+
+    # The time filters run through the sorted timestamp indexes
+    posted = next(slider for slider in at.sidebar.slider if slider.label.startswith("Posted"))
+    start, end = posted.value
+    posted.set_range(end - timedelta(hours=6), end).run()
+    assert not at.exception, at.exception
+
+    # Tabs only render their charts while open
+    for tab in at.tabs[1:]:
+        at.session_state['analytics_tab'] = tab.label
+        at.run()
+        assert not at.exception, at.exception
+        assert len(at.get('plotly_chart')) > 0
+
+    # Table search and paging run on the server
+    at.text_input[0].input('a').run()
+    assert not at.exception, at.exception
+    assert len(at.dataframe[0].value) <= 25
+
+    # The rate tab's scatter can switch to the density view
+    at.session_state['analytics_tab'] = at.tabs[1].label
+    at.run()
+    scatter_mode = next(radio for radio in at.radio if radio.label == "Scatter mode")
+    scatter_mode.set_value('Density').run()
+    assert not at.exception, at.exception
+
+    # The timing panel only appears when profiling is on
+    assert not any(expander.label.startswith('⏱️') for expander in at.expander)
+    at.query_params['profile'] = '1'
+    at.run()
+    assert not at.exception, at.exception
+    assert any(expander.label.startswith('⏱️') for expander in at.expander)
+    print("SUCCESS: Dashboard renders")
+    return True
+
 if __name__ == "__main__":
     print("Logistics Dashboard Test")
     print("=" * 50)
@@ -62,6 +1018,30 @@ if __name__ == "__main__":
     success = True
     success &= test_data_loading()
     success &= test_data_processing()
+    success &= test_file_sources()
+    success &= test_parallel_parsing()
+    success &= test_sample_generator()
+    success &= test_frame_cache()
+    success &= test_dtype_schema()
+    success &= test_route_lanes()
+    success &= test_filter_index()
+    success &= test_spatial_index()
+    success &= test_deadhead()
+    success &= test_load_matching()
+    success &= test_shared_frame()
+    success &= test_selection_cache()
+    success &= test_aggregate_engine()
+    success &= test_aggregate_cube()
+    success &= test_map_points()
+    success &= test_histograms()
+    success &= test_box_stats()
+    success &= test_scatter_modes()
+    success &= test_data_table()
+    success &= test_incremental_ingest()
+    success &= test_background_refresh()
+    success &= test_benchmark_harness()
+    success &= test_run_timer()
+    success &= test_dashboard_renders()
     
     print("\n" + "=" * 50)
     if success: